@@ -0,0 +1,73 @@
+"""
+Memory benchmark for keeping many parsed RPC messages, comparing the slotted representations with
+equivalent classes storing their fields in a `__dict__` (as done previously).
+
+Run from the repository root with `python -m benchmarks.rpc_memory`.
+"""
+import tracemalloc
+from typing import Any, Callable
+
+from sipgate_e2e_test_utils.json_rpc import JsonRpcRequest, JsonRpcResponse, JsonRpcResponseType, V20
+from sipgate_e2e_test_utils.xml_rpc import XmlRpcRequest, XmlRpcResponse, XmlRpcResponseType
+
+MESSAGES = 100_000
+
+
+class DictJsonRpcRequest:
+    def __init__(self, version: Any, method: str, params: Any, id: Any) -> None:
+        self.version = version
+        self.method = method
+        self.params = params
+        self.id = id
+
+
+class DictJsonRpcResponse:
+    def __init__(self, type: Any, fault: Any, members: Any, version: Any, id: Any) -> None:
+        self.type = type
+        self.fault = fault
+        self.members = members
+        self.version = version
+        self.id = id
+
+
+class DictXmlRpcRequest:
+    def __init__(self, method_name: str, members: Any) -> None:
+        self.method_name = method_name
+        self.members = members
+
+
+class DictXmlRpcResponse:
+    def __init__(self, type: Any, fault: Any, members: Any) -> None:
+        self.type = type
+        self.fault = fault
+        self.members = members
+
+
+def measure(create: Callable[[int], Any]) -> float:
+    # the (shared) field values are created up front, so only the instances themselves are measured
+    tracemalloc.start()
+    messages = [create(i) for i in range(MESSAGES)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del messages
+    return size / MESSAGES
+
+
+def main() -> None:
+    params: dict[str, Any] = {}
+    fault = (200, 'OK')
+    candidates = [
+        ('JsonRpcRequest', lambda i: JsonRpcRequest(V20, 'a_method', params, 'an_id'), lambda i: DictJsonRpcRequest(V20, 'a_method', params, 'an_id')),
+        ('JsonRpcResponse', lambda i: JsonRpcResponse(JsonRpcResponseType.RESULT, fault, params, V20, 'an_id'),
+         lambda i: DictJsonRpcResponse(JsonRpcResponseType.RESULT, fault, params, V20, 'an_id')),
+        ('XmlRpcRequest', lambda i: XmlRpcRequest('a_method', params), lambda i: DictXmlRpcRequest('a_method', params)),
+        ('XmlRpcResponse', lambda i: XmlRpcResponse(XmlRpcResponseType.RESULT, fault, params), lambda i: DictXmlRpcResponse(XmlRpcResponseType.RESULT, fault, params)),
+    ]
+
+    for name, slotted, with_dict in candidates:
+        print(f'{name:16} slots: {measure(slotted):6.1f} bytes/instance, __dict__: {measure(with_dict):6.1f} bytes/instance')
+
+
+if __name__ == '__main__':
+    main()
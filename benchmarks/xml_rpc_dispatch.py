@@ -0,0 +1,70 @@
+"""
+Micro-benchmark for the XML-RPC value type dispatch on a struct with 10k members.
+Compares the lookup in the module-level registries with building the dispatch table on every call (as done previously),
+by time and by the memory allocated per dispatch (measured with tracemalloc).
+
+Run from the repository root with `python -m benchmarks.xml_rpc_dispatch`.
+"""
+import timeit
+import tracemalloc
+from typing import Any, Callable
+
+from sipgate_e2e_test_utils import xml_rpc
+from sipgate_e2e_test_utils.xml_rpc import XmlRpcRequest
+
+MEMBERS = 10_000
+RUNS = 10
+
+
+def per_call_table(value: Any) -> str:
+    val_mappers: dict[type, Callable[[Any], str]] = {
+        int: lambda val: f'<i4>{val}</i4>',
+        str: lambda val: f'<string>{val}</string>',
+        bool: lambda val: f'<boolean>{int(val)}</boolean>',
+        dict: lambda val: '',
+        list: lambda val: '',
+    }
+
+    return val_mappers[type(value)](value)
+
+
+def registry(value: Any) -> str:
+    return xml_rpc._VALUE_SERIALIZERS[type(value)](value)
+
+
+def allocated_per_call(dispatch: Callable[[Any], str], values: list[Any]) -> float:
+    # the dispatch tables are garbage right after each call, so the peak above the retained memory is what one call allocates
+    tracemalloc.start()
+    allocated = 0
+    for value in values:
+        tracemalloc.reset_peak()
+        result = dispatch(value)
+        retained, peak = tracemalloc.get_traced_memory()
+        allocated += peak - retained
+        del result
+    tracemalloc.stop()
+
+    return allocated / len(values)
+
+
+def main() -> None:
+    members = {f'member_{i}': i if i % 2 else f'value_{i}' for i in range(MEMBERS)}
+    values = list(members.values())
+
+    per_call = min(timeit.repeat(lambda: [per_call_table(v) for v in values], number=RUNS, repeat=5)) / RUNS
+    hoisted = min(timeit.repeat(lambda: [registry(v) for v in values], number=RUNS, repeat=5)) / RUNS
+    per_call_allocated = allocated_per_call(per_call_table, values)
+    hoisted_allocated = allocated_per_call(registry, values)
+    print(f'dispatch of {MEMBERS} values, per-call table: {per_call * 1000:.2f} ms, {per_call_allocated:.0f} bytes allocated and freed per value')
+    print(f'dispatch of {MEMBERS} values, registry:       {hoisted * 1000:.2f} ms, {hoisted_allocated:.0f} bytes allocated and freed per value')
+
+    request = XmlRpcRequest('a_method', members)
+    body = request.serialize()
+    serialize = min(timeit.repeat(request.serialize, number=RUNS, repeat=5)) / RUNS
+    parse = min(timeit.repeat(lambda: XmlRpcRequest.parse(body), number=RUNS, repeat=5)) / RUNS
+    print(f'XmlRpcRequest.serialize() with {MEMBERS} members: {serialize * 1000:.2f} ms')
+    print(f'XmlRpcRequest.parse() with {MEMBERS} members:     {parse * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
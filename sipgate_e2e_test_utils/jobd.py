@@ -1,47 +1,320 @@
+import asyncio
+import functools
+import itertools
 import os
-from typing import Any
+import time
+from dataclasses import dataclass
+from importlib import resources
+from typing import Any, Callable, Iterable
 
 import aiohttp
 import socket
-from http_request_recorder import HttpRequestRecorder
+from http_request_recorder import HttpRequestRecorder, RecordedRequest
 
-from sipgate_e2e_test_utils.rpc_matchers import xml_rpc
+from sipgate_e2e_test_utils.rpc_matchers import xml_rpc, xml_rpc_request
 from sipgate_e2e_test_utils.xml_rpc import XmlRpcRequest, XmlRpcResponse
 
-with open(os.path.join(os.path.dirname(__file__), 'jobd_functions.xml')) as file:
-    JOBD_FUNCTIONS_XML = file.read()
+UPDATE_EVENT_RESPONSE = XmlRpcResponse.result(200, 'ok').freeze()
+
+DEFAULT_PORT = 8777
+
+# free ports tried when starting a recorder with port 0, in case another process takes one before the recorder listens on it
+FREE_PORT_ATTEMPTS = 5
+
+# the uniqueid of each triggered job, echoed in its jobd.updateEvent
+__unique_ids = itertools.count(1)
+
+
+@dataclass(frozen=True, slots=True)
+class JobTiming:
+    """
+    Durations (in seconds) of a triggered job: the `cron.triggerJob` request (`trigger`),
+    from its response until the `jobd.updateEvent` was received (`notification`) and both together (`total`).
+    """
+    trigger: float
+    notification: float
+    total: float
+
+
+class JobTimings:
+    """Timings of the triggered jobs by job name, summarized as quantiles (p50, p95, p99)."""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+    PHASES = ('trigger', 'notification', 'total')
+
+    def __init__(self) -> None:
+        self.__timings: dict[str, list[JobTiming]] = {}
+
+    def record(self, job_name: str, timing: JobTiming) -> None:
+        self.__timings.setdefault(job_name, []).append(timing)
+
+    def timings(self, job_name: str) -> list[JobTiming]:
+        return list(self.__timings.get(job_name, []))
+
+    def summary(self) -> dict[str, dict[str, dict[str, float]]]:
+        """
+        Per job name and phase: the count and quantiles of the durations, e.g.
+        {'any_job': {'total': {'count': 3, 'p50': 0.25, 'p95': 0.31, 'p99': 0.32}, 'trigger': {...}, 'notification': {...}}}
+        """
+        return {
+            job_name: {phase: _summarize([getattr(timing, phase) for timing in timings]) for phase in JobTimings.PHASES}
+            for job_name, timings in self.__timings.items()
+        }
+
+    def prometheus(self, metric_name: str = 'jobd_job_duration_seconds') -> str:
+        """The timings in Prometheus text exposition format, as a summary labeled by job and phase."""
+        lines = [f'# HELP {metric_name} Duration of JobD jobs triggered by tests', f'# TYPE {metric_name} summary']
+        for job_name, timings in self.__timings.items():
+            for phase in JobTimings.PHASES:
+                durations = sorted(getattr(timing, phase) for timing in timings)
+                labels = f'job="{_escape_label(job_name)}",phase="{phase}"'
+                lines.extend(f'{metric_name}{{{labels},quantile="{quantile}"}} {_quantile(durations, quantile)}' for quantile in JobTimings.QUANTILES)
+                lines.append(f'{metric_name}_sum{{{labels}}} {sum(durations)}')
+                lines.append(f'{metric_name}_count{{{labels}}} {len(durations)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+@dataclass(frozen=True, slots=True)
+class JobResult:
+    """A parsed `jobd.updateEvent`: the members defined for it by the JobD interface, all of its `members` and the `timing` of the job."""
+    system_name: str | None
+    event_name: str | None
+    uniqueid: str | None
+    status: str | None
+    members: dict[str, Any]
+    timing: JobTiming | None = None
+
+    @staticmethod
+    def from_request(request: XmlRpcRequest, timing: JobTiming | None = None) -> 'JobResult':
+        if request.method_name != 'jobd.updateEvent':
+            raise ValueError(f"expected a 'jobd.updateEvent', got '{request.method_name}'")
+
+        members = request.members
+        return JobResult(
+            _optional_str(members.get('systemName')),
+            _optional_str(members.get('eventName')),
+            _optional_str(members.get('uniqueid')),
+            _optional_str(members.get('status')),
+            members,
+            timing)
 
 
 class JobD:
-    def __init__(self, system_hostname: str, system_port: int) -> None:
-        self.notification_url = f"http://{socket.gethostname()}:8777/RPC2"
+    def __init__(self, system_hostname: str, system_port: int, shared: 'SharedJobD | None' = None, port: int = DEFAULT_PORT) -> None:
+        """
+        Without `shared`, each context starts its own recorder and HTTP session, listening on `port` (0 picks a free one, see also `worker_port()`).
+        The recorder needs a fixed port, so a free one is looked up before it listens: should another process (e.g. a parallel test worker)
+        take it in the meantime, another one is picked on entering the context, updating `port` and `notification_url`.
+        Ports per worker (`worker_port()`) avoid this race.
+        With `shared`, those of the (already entered) `SharedJobD` are used and each context only cleans up its own expectations:
+        they stop matching on exit (`HttpRequestRecorder` has no API for removing them, so they stay registered with the recorder).
+        """
+        self.port = _resolve_port(port) if shared is None else shared.port
+        self.notification_url = _notification_url(self.port)
+        self.__free_port = port == 0 and shared is None
         self.system_url = f"http://{system_hostname}:{system_port}/RPC2"
+        self.shared = shared
+        self.timings = JobTimings() if shared is None else shared.timings
+        self.__active = False
 
     async def __aenter__(self) -> "JobD":
-        self.recorder = HttpRequestRecorder(name='JobD', port=8777)
-        self.recorder.expect_path(path='/functions.xml',
-                                  responses=(JOBD_FUNCTIONS_XML for _ in range(100)))
+        if self.shared is None:
+            (self.recorder, self.port) = await _start_recorder(self.port, self.__free_port)
+            self.notification_url = _notification_url(self.port)
+            self.session = aiohttp.ClientSession()
+        else:
+            self.recorder = self.shared.recorder
+            self.session = self.shared.session
 
-        self.session = aiohttp.ClientSession()
-
-        await self.recorder.__aenter__()
+        self.__active = True
         return self
 
     async def trigger_job_and_record_answer(self, job_name: str, timeout: int = 10) -> bytes:
-        expectation = self.recorder.expect(
-            xml_rpc('jobd.updateEvent'), responses=XmlRpcResponse.result(200, 'ok').serialize(), timeout=timeout)
+        """Triggers a job and returns the body of the next `jobd.updateEvent` (regardless of its uniqueid)."""
+        (body, _, _) = await self.__trigger(job_name, _next_unique_id(), xml_rpc('jobd.updateEvent'), timeout)
+        return body
+
+    async def trigger_job(self, job_name: str, timeout: int = 10) -> 'JobResult':
+        """Like `trigger_job_and_record_answer()`, but returns the parsed `jobd.updateEvent`."""
+        (body, recorded_request, timing) = await self.__trigger(job_name, _next_unique_id(), xml_rpc('jobd.updateEvent'), timeout)
+        return JobResult.from_request(_parse_update_event(body, recorded_request), timing)
+
+    async def trigger_jobs(self, job_names: Iterable[str], concurrency: int = 10, timeout: int = 10) -> list[bytes]:
+        """
+        Triggers the jobs in parallel (at most `concurrency` at a time) and returns the bodies of their `jobd.updateEvent`s, in the order of `job_names`.
+        Each job gets its own uniqueid, by which its notification is told apart from the others.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def trigger(job_name: str) -> bytes:
+            async with semaphore:
+                uniqueid = _next_unique_id()
+                matcher = xml_rpc('jobd.updateEvent', members={'uniqueid': lambda value: str(value) == str(uniqueid)})
+                (body, _, _) = await self.__trigger(job_name, uniqueid, matcher, timeout)
+                return body
+
+        return list(await asyncio.gather(*(trigger(job_name) for job_name in job_names)))
+
+    async def __trigger(self, job_name: str, uniqueid: int, matcher: Callable[[RecordedRequest], bool], timeout: int) -> tuple[bytes, RecordedRequest | None, JobTiming]:
+        # the matched request is kept, so that its memoized parse result can be reused (see `rpc_matchers.xml_rpc_request()`)
+        matched: list[RecordedRequest] = []
+
+        def keep_matched(request: RecordedRequest) -> bool:
+            if not matcher(request):
+                return False
+
+            if not matched:
+                matched.append(request)
+            return True
+
+        expectation = self.recorder.expect(self.__scoped(keep_matched), responses=UPDATE_EVENT_RESPONSE.serialize_bytes(compact=True), timeout=timeout)
 
-        response = await self.session.post(self.system_url, data=XmlRpcRequest('cron.triggerJob', {
+        started = time.perf_counter()
+        # the response is released at the end of the block, so that its connection can be reused
+        async with self.session.post(self.system_url, data=XmlRpcRequest('cron.triggerJob', {
             'jobName': job_name,
             'notificationUrl': self.notification_url,
-            'uniqueid': 42
-        }).serialize())
-        assert 200 == response.status
+            'uniqueid': uniqueid
+        }).serialize_bytes(compact=True)) as response:
+            assert 200 == response.status
 
+        triggered = time.perf_counter()
         recorded_request: bytes = await expectation.wait()
-        return recorded_request
+        notified = time.perf_counter()
+
+        timing = JobTiming(triggered - started, notified - triggered, notified - started)
+        self.timings.record(job_name, timing)
+        return recorded_request, matched[0] if matched else None, timing
 
     async def __aexit__(self, *args: tuple[Any]) -> None:
+        # expectations of this context must not consume requests meant for later contexts sharing the recorder
+        self.__active = False
+
+        if self.shared is not None:
+            return None
+
         await self.session.close()
         await_aexit__: None = await self.recorder.__aexit__(*args)
         return await_aexit__
+
+    def __scoped(self, matcher: Callable[[RecordedRequest], bool]) -> Callable[[RecordedRequest], bool]:
+        return lambda request: self.__active and matcher(request)
+
+
+class SharedJobD:
+    """
+    Recorder and HTTP session for many `JobD`s, e.g. a session-scoped fixture shared by all tests, so only the first one pays for starting them:
+
+    async with SharedJobD() as shared:
+        async with JobD('localhost', 8080, shared) as jobd:
+            ...
+
+    Connections to the system are kept alive and limited to `connection_limit`. The recorder listens on `port` (see `JobD`).
+    """
+
+    def __init__(self, connection_limit: int = 10, keepalive_timeout: float = 60, port: int = DEFAULT_PORT) -> None:
+        self.port = _resolve_port(port)
+        self.__free_port = port == 0
+        self.timings = JobTimings()
+        self.connection_limit = connection_limit
+        self.keepalive_timeout = keepalive_timeout
+
+    async def __aenter__(self) -> "SharedJobD":
+        (self.recorder, self.port) = await _start_recorder(self.port, self.__free_port)
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.connection_limit, keepalive_timeout=self.keepalive_timeout))
+        return self
+
+    def jobd(self, system_hostname: str, system_port: int) -> JobD:
+        return JobD(system_hostname, system_port, self)
+
+    async def __aexit__(self, *args: tuple[Any]) -> None:
+        await self.session.close()
+        await self.recorder.__aexit__(*args)
+
+
+@functools.cache
+def jobd_functions_xml() -> bytes:
+    """The JobD interface description served as /functions.xml, read on first use."""
+    return resources.files('sipgate_e2e_test_utils').joinpath('jobd_functions.xml').read_bytes()
+
+
+def __getattr__(name: str) -> Any:
+    if name == 'JOBD_FUNCTIONS_XML':
+        return jobd_functions_xml().decode()
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def worker_port(base: int = DEFAULT_PORT) -> int:
+    """A port per pytest-xdist worker (`base` for gw0, `base + 1` for gw1, ...), `base` when not running in a worker."""
+    worker = os.environ.get('PYTEST_XDIST_WORKER', 'gw0')
+    return base + int(worker.removeprefix('gw'))
+
+
+def _resolve_port(port: int) -> int:
+    if port != 0:
+        return port
+
+    # the recorder needs a fixed port, so a free one is looked up (and released again) before starting it, see `_start_recorder()`
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(('', 0))
+        free_port: int = probe.getsockname()[1]
+        return free_port
+
+
+def _notification_url(port: int) -> str:
+    return f"http://{socket.gethostname()}:{port}/RPC2"
+
+
+def _summarize(durations: list[float]) -> dict[str, float]:
+    durations = sorted(durations)
+    return {'count': len(durations), **{f'p{round(quantile * 100)}': _quantile(durations, quantile) for quantile in JobTimings.QUANTILES}}
+
+
+def _quantile(durations: list[float], quantile: float) -> float:
+    """Linearly interpolated between the closest ranks of the sorted `durations`."""
+    if not durations:
+        return float('nan')
+
+    position = (len(durations) - 1) * quantile
+    lower = int(position)
+    upper = min(lower + 1, len(durations) - 1)
+    return durations[lower] + (durations[upper] - durations[lower]) * (position - lower)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _optional_str(value: Any) -> str | None:
+    return None if value is None else str(value)
+
+
+def _parse_update_event(body: bytes, recorded_request: RecordedRequest | None) -> XmlRpcRequest:
+    # the first matched request is not necessarily the one whose body was returned (e.g. if a notification was sent twice)
+    parsed = None if recorded_request is None or recorded_request.body != body else xml_rpc_request(recorded_request)
+    return XmlRpcRequest.parse(body) if parsed is None else parsed
+
+
+def _next_unique_id() -> int:
+    return next(__unique_ids)
+
+
+async def _start_recorder(port: int, free_port: bool) -> tuple[HttpRequestRecorder, int]:
+    """Starts a recorder listening on `port`. A `free_port` taken by another process in the meantime is replaced by another free one."""
+    attempts = 1
+    while True:
+        recorder = HttpRequestRecorder(name='JobD', port=port)
+        # served for as many requests as the system makes, always from the same buffer
+        recorder.expect_path(path='/functions.xml', responses=itertools.repeat(jobd_functions_xml()))
+
+        try:
+            await recorder.__aenter__()
+            return recorder, port
+        except OSError:
+            if not free_port or attempts == FREE_PORT_ATTEMPTS:
+                raise
+
+        attempts += 1
+        port = _resolve_port(0)
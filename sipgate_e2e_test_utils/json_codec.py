@@ -0,0 +1,67 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Callable
+
+
+@dataclass(frozen=True)
+class JsonCodec:
+    """
+    (De-)serialization functions used for JSON-RPC bodies.
+    Decoding errors are expected to be `json.JSONDecodeError`s (orjson's errors are a subclass).
+    """
+    name: str
+    loads: Callable[[str | bytes], Any]
+    dumps: Callable[[Any], str]
+    dumps_bytes: Callable[[Any], bytes]
+
+
+STDLIB_CODEC = JsonCodec('json', json.loads, json.dumps, lambda obj: json.dumps(obj).encode())
+
+try:
+    import orjson
+
+    # orjson parses integers exceeding 64 bit as (lossy) floats, so bodies containing such long numbers are decoded by the standard library
+    __LONG_NUMBER = (re.compile(r'\d{19}'), re.compile(rb'\d{19}'))
+
+    def __orjson_loads(body: str | bytes) -> Any:
+        if __LONG_NUMBER[not isinstance(body, str)].search(body):
+            return json.loads(body)
+
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # e.g. NaN or Infinity, which are supported by the standard library
+            return json.loads(body)
+
+    def __orjson_dumps_bytes(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # e.g. integers exceeding 64 bit, which are supported by the standard library
+            return json.dumps(obj).encode()
+
+    ORJSON_CODEC: JsonCodec | None = JsonCodec('orjson', __orjson_loads, lambda obj: __orjson_dumps_bytes(obj).decode(), __orjson_dumps_bytes)
+except ImportError:
+    ORJSON_CODEC = None
+
+__codec = STDLIB_CODEC
+
+
+def json_codec() -> JsonCodec:
+    """The codec currently used: the standard library, unless orjson (e.g. using the `orjson` extra) or a custom codec is selected by `use_json_codec()`."""
+    return __codec
+
+
+def use_json_codec(codec: JsonCodec | str) -> None:
+    """Selects the codec for the whole process, either by name ('json' or 'orjson') or by passing a custom `JsonCodec`."""
+    global __codec
+
+    if isinstance(codec, JsonCodec):
+        __codec = codec
+    elif codec == STDLIB_CODEC.name:
+        __codec = STDLIB_CODEC
+    elif codec == 'orjson' and ORJSON_CODEC is not None:
+        __codec = ORJSON_CODEC
+    else:
+        raise ValueError(f'JSON codec {codec=} is not available')
@@ -1,9 +1,18 @@
-import json
-import uuid
+import re
 from dataclasses import dataclass
 from enum import Enum
-from json import JSONDecodeError
-from typing import Any
+from json import JSONDecodeError, JSONDecoder
+from json.decoder import scanstring
+from typing import Any, Callable
+
+from sipgate_e2e_test_utils.json_codec import json_codec, STDLIB_CODEC
+from sipgate_e2e_test_utils.json_rpc_ids import request_id
+from sipgate_e2e_test_utils.streams import ChunkReader, CHUNK_SIZE
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 
 class ParseError(SyntaxError):
@@ -21,6 +30,9 @@ class JsonRpcVersion(Enum):
 V11 = JsonRpcVersion.V11
 V20 = JsonRpcVersion.V20
 
+# smaller bodies are parsed eagerly even if lazy parsing is requested, as scanning them is slower than decoding them at once
+LAZY_PARSING_MIN_SIZE = 2048
+
 
 class JsonRpcRequest:
     """
@@ -28,6 +40,7 @@ class JsonRpcRequest:
     The request version governs how an empty `params` field is (de-)serialized (<null> for V1.1 vs {} for V2.0).
     When using the RpcRequest in python code, the empty `params` field will always be {} to enable simpler test assertions.
     """
+    __slots__ = ('version', 'method', 'params', 'id')
 
     version: JsonRpcVersion
     method: str
@@ -37,38 +50,27 @@ class JsonRpcRequest:
     def __init__(self, version: JsonRpcVersion, method: str, params=None, id=None):
         self.version = version
         self.method = method
-        self.id = str(uuid.uuid4()) if id is None else id
+        self.id = request_id() if id is None else id
         self.params = {} if params is None else params
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} method='{self.method}' params={self.params} version='{self.version}' id='{self.id}'>"
 
     @staticmethod
-    def parse(body: str | bytes) -> 'JsonRpcRequest':
+    def parse(body: str | bytes, lazy: bool = False) -> 'JsonRpcRequest':
+        """
+        With `lazy`, only the envelope (version, method, id) is decoded and validated, while non-empty object `params` are decoded
+        when first accessed (for bodies of at least `LAZY_PARSING_MIN_SIZE`). Errors within the params are then raised on access.
+        """
+        if lazy:
+            return _parse_lazily(body, ('params',), _request_from_json, JsonRpcRequest.parse)
+
         try:
-            json_body = json.loads(body)
+            json_body = json_codec().loads(body)
         except JSONDecodeError:
             raise ParseError(f'{body=} must be valid JSON')
 
-        try:
-            method_name = json_body['method']
-            params = json_body['params']
-            id = json_body['id']
-        except KeyError:
-            raise ParseError(f'{body=} must contain keys `method`, `params` and `id`')
-
-        if type(method_name) is not str or method_name == '':
-            raise ParseError(f'{method_name=} must be non-empty string')
-
-        version = _parse_request_version(json_body)
-
-        if version == JsonRpcVersion.V11 and params is None:
-            raise ParseError(f'{params=} must NOT be <null> when using JSON-RPC V1.1')
-
-        if version == JsonRpcVersion.V20 and params == {}:
-            raise ParseError(f'{params=} must NOT be an empty object when using JSON-RPC V2.0')
-
-        return JsonRpcRequest(version, method_name, params, id)
+        return _request_from_json(json_body, body)
 
     def json(self) -> dict:
         fields = {
@@ -85,7 +87,10 @@ class JsonRpcRequest:
         return fields
 
     def serialize(self) -> str:
-        return json.dumps(self.json())
+        return json_codec().dumps(self.json())
+
+    def serialize_bytes(self) -> bytes:
+        return json_codec().dumps_bytes(self.json())
 
 
 class JsonRpcResponseType(Enum):
@@ -93,7 +98,7 @@ class JsonRpcResponseType(Enum):
     ERROR = 'error'
 
 
-@dataclass
+@dataclass(slots=True)
 class JsonRpcResponse:
     """
     Encapsulates parsing/serialization logic for sipgate JSON-RPC responses.
@@ -117,41 +122,45 @@ class JsonRpcResponse:
         return JsonRpcResponse(JsonRpcResponseType.ERROR, (fault_code, fault_string), {}, version, id)
 
     @staticmethod
-    def parse(body: str | bytes) -> 'JsonRpcResponse':
+    def parse(body: str | bytes, lazy: bool = False) -> 'JsonRpcResponse':
+        """
+        With `lazy`, only the envelope (version, id, whether it is a result or an error) is decoded and validated,
+        while the `fault` and `members` are decoded when first accessed (for bodies of at least `LAZY_PARSING_MIN_SIZE`).
+        Errors within the result/error are then raised on access.
+        """
+        if lazy:
+            return _parse_lazily(body, ('result', 'error'), _response_from_json, JsonRpcResponse.parse)
+
         try:
-            parsed_body = json.loads(body)
+            parsed_body = json_codec().loads(body)
         except JSONDecodeError:
             raise ParseError(f'{body=} must be valid JSON')
 
-        id = parsed_body['id'] if 'id' in parsed_body else None
-        version = _parse_response_version(parsed_body)
-
-        has_error = 'error' in parsed_body and parsed_body['error'] is not None
-        has_result = 'result' in parsed_body and parsed_body['result'] is not None
+        return _response_from_json(parsed_body, body)
 
-        if has_error and has_result:
-            raise ParseError(f'{body=} must contain either `error` or `result`, found both')
-        elif has_error:
-            response_type = JsonRpcResponseType.ERROR
-        elif has_result:
-            response_type = JsonRpcResponseType.RESULT
-        else:
-            raise ParseError(f'{body=} must contain either `error` or `result`, found neither')
-
-        obj = parsed_body[response_type.value]
-        if 'faultCode' not in obj or type(obj['faultCode']) is not int:
-            raise ParseError(f'{body=} must contain int `faultCode`')
+    @staticmethod
+    async def parse_stream(reader: ChunkReader) -> 'JsonRpcResponse':
+        """
+        Parses a body chunk by chunk while reading it using ijson, if installed (e.g. using the `ijson` extra).
+        Only the parser state is then kept in memory besides the response, instead of the whole body.
+        Without ijson, the body is read completely before parsing it.
+        """
+        if ijson is None:
+            chunks = []
+            while chunk := await reader.read(CHUNK_SIZE):
+                chunks.append(chunk)
+
+            return JsonRpcResponse.parse(b''.join(chunks))
 
-        fault_code = obj.pop('faultCode')
+        try:
+            values = [value async for value in ijson.items_async(reader, '', use_float=True, buf_size=CHUNK_SIZE)]
+        except ijson.JSONError:
+            raise ParseError('streamed body must be valid JSON')
 
-        if 'faultString' in obj:
-            if type(obj['faultString']) is not str:
-                raise ParseError(f'{body=} must contain string `faultString`')
-            fault_string = obj.pop('faultString')
-        else:
-            fault_string = ''
+        if len(values) != 1 or type(values[0]) is not dict:
+            raise ParseError(f'streamed body must be a single object, found {values=}')
 
-        return JsonRpcResponse(response_type, (fault_code, fault_string), obj, version, id)
+        return _response_from_json(values[0], values[0])
 
     def json(self) -> dict:
         (fault_code, fault_string) = self.fault
@@ -175,12 +184,170 @@ class JsonRpcResponse:
         return fields
 
     def serialize(self) -> str:
-        return json.dumps(self.json())
+        return json_codec().dumps(self.json())
+
+    def serialize_bytes(self) -> bytes:
+        return json_codec().dumps_bytes(self.json())
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} type={self.type} fault={self.fault} members={self.members} version='{self.version}' id='{self.id}'>"
 
 
+@dataclass(slots=True)
+class JsonRpcBatchRequest:
+    """
+    Encapsulates parsing/serialization logic for JSON-RPC batches, i.e. an array of requests sent at once.
+    Each element follows the same rules as a single `JsonRpcRequest`. An invalid element does not fail the whole batch,
+    its `ParseError` is put in place of the request instead.
+    """
+
+    requests: list[JsonRpcRequest | ParseError]
+
+    @staticmethod
+    def parse(body: str | bytes) -> 'JsonRpcBatchRequest':
+        return JsonRpcBatchRequest(_parse_batch(body, _request_from_json))
+
+    def valid(self) -> list[JsonRpcRequest]:
+        return [request for request in self.requests if isinstance(request, JsonRpcRequest)]
+
+    def errors(self) -> list[ParseError]:
+        return [request for request in self.requests if isinstance(request, ParseError)]
+
+    def json(self) -> list[dict]:
+        if self.errors():
+            raise ValueError(f'cannot serialize invalid batch elements {self.errors()}')
+
+        return [request.json() for request in self.valid()]
+
+    def serialize(self) -> str:
+        return json_codec().dumps(self.json())
+
+    def serialize_bytes(self) -> bytes:
+        return json_codec().dumps_bytes(self.json())
+
+
+@dataclass(slots=True)
+class JsonRpcBatchResponse:
+    """
+    Encapsulates parsing/serialization logic for responses to JSON-RPC batches.
+    Each element follows the same rules as a single `JsonRpcResponse`. An invalid element does not fail the whole batch,
+    its `ParseError` is put in place of the response instead.
+    """
+
+    responses: list[JsonRpcResponse | ParseError]
+
+    @staticmethod
+    def parse(body: str | bytes) -> 'JsonRpcBatchResponse':
+        return JsonRpcBatchResponse(_parse_batch(body, _response_from_json))
+
+    def valid(self) -> list[JsonRpcResponse]:
+        return [response for response in self.responses if isinstance(response, JsonRpcResponse)]
+
+    def errors(self) -> list[ParseError]:
+        return [response for response in self.responses if isinstance(response, ParseError)]
+
+    def json(self) -> list[dict]:
+        if self.errors():
+            raise ValueError(f'cannot serialize invalid batch elements {self.errors()}')
+
+        return [response.json() for response in self.valid()]
+
+    def serialize(self) -> str:
+        return json_codec().dumps(self.json())
+
+    def serialize_bytes(self) -> bytes:
+        return json_codec().dumps_bytes(self.json())
+
+
+def _parse_batch[T](body: str | bytes, from_json: Callable[[Any, Any], T]) -> list[T | ParseError]:
+    try:
+        json_body = json_codec().loads(body)
+    except JSONDecodeError:
+        raise ParseError(f'{body=} must be valid JSON')
+
+    if type(json_body) is not list or json_body == []:
+        raise ParseError(f'{body=} must be a non-empty array')
+
+    elements: list[T | ParseError] = []
+    for element in json_body:
+        try:
+            if type(element) is not dict:
+                raise ParseError(f'{element=} must be an object')
+
+            elements.append(from_json(element, element))
+        except ParseError as e:
+            elements.append(e)
+        except Exception as e:
+            elements.append(ParseError(f'{element=} is invalid ({e!r})'))
+
+    return elements
+
+
+def _request_from_json(json_body: Any, body: Any) -> JsonRpcRequest:
+    try:
+        method_name = json_body['method']
+        params = json_body['params']
+        id = json_body['id']
+    except KeyError:
+        raise ParseError(f'{body=} must contain keys `method`, `params` and `id`')
+
+    if type(method_name) is not str or method_name == '':
+        raise ParseError(f'{method_name=} must be non-empty string')
+
+    version = _parse_request_version(json_body)
+
+    if version == JsonRpcVersion.V11 and params is None:
+        raise ParseError(f'{params=} must NOT be <null> when using JSON-RPC V1.1')
+
+    if version == JsonRpcVersion.V20 and params == {}:
+        raise ParseError(f'{params=} must NOT be an empty object when using JSON-RPC V2.0')
+
+    if type(params) is _Deferred:
+        return _LazyJsonRpcRequest(version, method_name, params, id)
+
+    return JsonRpcRequest(version, method_name, params, id)
+
+
+def _response_from_json(parsed_body: Any, body: Any) -> JsonRpcResponse:
+    id = parsed_body['id'] if 'id' in parsed_body else None
+    version = _parse_response_version(parsed_body)
+
+    has_error = 'error' in parsed_body and parsed_body['error'] is not None
+    has_result = 'result' in parsed_body and parsed_body['result'] is not None
+
+    if has_error and has_result:
+        raise ParseError(f'{body=} must contain either `error` or `result`, found both')
+    elif has_error:
+        response_type = JsonRpcResponseType.ERROR
+    elif has_result:
+        response_type = JsonRpcResponseType.RESULT
+    else:
+        raise ParseError(f'{body=} must contain either `error` or `result`, found neither')
+
+    obj = parsed_body[response_type.value]
+    if type(obj) is _Deferred:
+        return _LazyJsonRpcResponse(response_type, obj, obj, version, id)
+
+    (fault, members) = _split_fault(obj, body)
+    return JsonRpcResponse(response_type, fault, members, version, id)
+
+
+def _split_fault(obj: Any, body: Any) -> tuple[tuple[int, str], dict[str, Any]]:
+    if 'faultCode' not in obj or type(obj['faultCode']) is not int:
+        raise ParseError(f'{body=} must contain int `faultCode`')
+
+    fault_code = obj.pop('faultCode')
+
+    if 'faultString' in obj:
+        if type(obj['faultString']) is not str:
+            raise ParseError(f'{body=} must contain string `faultString`')
+        fault_string = obj.pop('faultString')
+    else:
+        fault_string = ''
+
+    return (fault_code, fault_string), obj
+
+
 def _parse_request_version(json_body: dict[str, Any]) -> JsonRpcVersion:
     has_jsonrpc_field = 'jsonrpc' in json_body
     has_version_field = 'version' in json_body
@@ -209,3 +376,266 @@ def _parse_response_version(json_body: dict[str, Any]) -> JsonRpcVersion | None:
         return JsonRpcVersion.V20
     else:
         raise ParseError(f'{json_body=} must either contain `jsonrpc=2.0` or `version=1.1` or neither of those')
+
+
+class _Deferred:
+    """A JSON object within a body, which is decoded only when needed (see `_scan_members()`)."""
+    __slots__ = ('body', 'start', 'end')
+
+    def __init__(self, body: str, start: int, end: int):
+        self.body = body
+        self.start = start
+        self.end = end
+
+    def decode(self) -> Any:
+        return json_codec().loads(self.body[self.start:self.end])
+
+
+_REQUEST_PARAMS = vars(JsonRpcRequest)['params']
+_RESPONSE_FAULT = vars(JsonRpcResponse)['fault']
+_RESPONSE_MEMBERS = vars(JsonRpcResponse)['members']
+
+
+class _LazyJsonRpcRequest(JsonRpcRequest):
+    """A `JsonRpcRequest` decoding its params on first access, see `JsonRpcRequest.parse(body, lazy=True)`."""
+    __slots__ = ()
+
+    @property  # type: ignore[override]
+    def params(self) -> dict[str, Any]:
+        self.__decode()
+        return _REQUEST_PARAMS.__get__(self)
+
+    @params.setter
+    def params(self, params: dict[str, Any]) -> None:
+        _REQUEST_PARAMS.__set__(self, params)
+
+    def json(self) -> dict:
+        self.__decode()
+        return super().json()
+
+    def __decode(self) -> None:
+        deferred = _REQUEST_PARAMS.__get__(self)
+        if type(deferred) is not _Deferred:
+            return
+
+        try:
+            params = deferred.decode()
+        except JSONDecodeError:
+            # the deferred object is not valid JSON, which the eager parsing reports as ParseError
+            request = JsonRpcRequest.parse(deferred.body)
+            (self.version, self.method, self.id, params) = (request.version, request.method, request.id, request.params)
+
+        _REQUEST_PARAMS.__set__(self, params)
+
+
+class _LazyJsonRpcResponse(JsonRpcResponse):
+    """A `JsonRpcResponse` decoding its fault and members on first access, see `JsonRpcResponse.parse(body, lazy=True)`."""
+    __slots__ = ()
+
+    @property  # type: ignore[override]
+    def fault(self) -> tuple[int, str]:
+        self.__decode()
+        return _RESPONSE_FAULT.__get__(self)
+
+    @fault.setter
+    def fault(self, fault: tuple[int, str]) -> None:
+        _RESPONSE_FAULT.__set__(self, fault)
+
+    @property  # type: ignore[override]
+    def members(self) -> dict[str, Any]:
+        self.__decode()
+        return _RESPONSE_MEMBERS.__get__(self)
+
+    @members.setter
+    def members(self, members: dict[str, Any]) -> None:
+        _RESPONSE_MEMBERS.__set__(self, members)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, JsonRpcResponse):
+            return NotImplemented
+
+        self.__decode()
+        return (self.type, self.fault, self.members, self.version, self.id) == (other.type, other.fault, other.members, other.version, other.id)
+
+    def json(self) -> dict:
+        self.__decode()
+        return super().json()
+
+    def __decode(self) -> None:
+        deferred = _RESPONSE_MEMBERS.__get__(self)
+        if type(deferred) is not _Deferred:
+            return
+
+        try:
+            (fault, members) = _split_fault(deferred.decode(), deferred.body)
+        except JSONDecodeError:
+            # the deferred object is not valid JSON, which the eager parsing reports as ParseError
+            response = JsonRpcResponse.parse(deferred.body)
+            (self.type, self.version, self.id, fault, members) = (response.type, response.version, response.id, response.fault, response.members)
+
+        if _RESPONSE_FAULT.__get__(self) is deferred:
+            _RESPONSE_FAULT.__set__(self, fault)
+        _RESPONSE_MEMBERS.__set__(self, members)
+
+
+_DECODER = JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_SCALAR_CHARACTERS = frozenset('0123456789+-.eEtrufalsn')
+_NOT_STRUCTURE = bytes(set(range(256)) - set(b'{}[]"'))
+
+
+def _parse_lazily[T](body: str | bytes, deferrable: tuple[str, ...], from_json: Callable[[Any, Any], T], parse: Callable[[str | bytes], T]) -> T:
+    if len(body) < LAZY_PARSING_MIN_SIZE:
+        return parse(body)
+
+    try:
+        members = _scan_members(body.decode() if isinstance(body, bytes) else body, deferrable)
+    except (ValueError, IndexError):
+        members = None
+
+    if members is None:
+        return parse(body)
+
+    try:
+        return from_json(members, body)
+    except Exception:
+        # validating the envelope may depend on the deferred object (e.g. a result and an error), which only the eager parsing has decoded
+        return parse(body)
+
+
+def _scan_members(body: str, deferrable: tuple[str, ...]) -> dict[str, Any] | None:
+    """
+    Decodes the members of the JSON object `body`, except for the first non-empty object member named in `deferrable`:
+    its extent is found by decoding the members after it backwards from the end of the body (which works for scalar members only)
+    and then proven to be a single object by matching its braces and brackets (ignoring strings).
+    Returns None if `body` is not a JSON object, there is nothing to defer or another object member follows the deferred one.
+    """
+    members: dict[str, Any] = {}
+    pos = _WHITESPACE.match(body).end()
+    if body[pos:pos + 1] != '{':
+        return None
+
+    pos = _WHITESPACE.match(body, pos + 1).end()
+    while True:
+        if body[pos:pos + 1] != '"':
+            return None
+
+        key, pos = scanstring(body, pos + 1)
+        pos = _WHITESPACE.match(body, pos).end()
+        if body[pos:pos + 1] != ':':
+            return None
+
+        pos = _WHITESPACE.match(body, pos + 1).end()
+        if key in deferrable and body[pos:pos + 1] == '{' and body[_WHITESPACE.match(body, pos + 1).end()] != '}':
+            break
+
+        members[key], pos = __decode_value(body, pos)
+        pos = _WHITESPACE.match(body, pos).end()
+        if body[pos:pos + 1] != ',':
+            # either invalid or the end of the object, without anything to defer
+            return None
+
+        pos = _WHITESPACE.match(body, pos + 1).end()
+
+    start = pos
+    trailing: list[tuple[str, Any]] = []
+    end = __skip_whitespace_backwards(body, len(body))
+    if body[end - 1:end] != '}':
+        return None
+
+    end = __skip_whitespace_backwards(body, end - 1)
+    while body[end - 1:end] != '}':
+        value_start = __find_string_start(body, end) if body[end - 1] == '"' else __find_scalar_start(body, end)
+        value, value_end = __decode_value(body, value_start)
+        colon = __skip_whitespace_backwards(body, value_start)
+        if value_end != end or body[colon - 1:colon] != ':':
+            return None
+
+        key_end = __skip_whitespace_backwards(body, colon - 1)
+        key_start = __find_string_start(body, key_end)
+        trailing_key, trailing_key_end = scanstring(body, key_start + 1)
+        comma = __skip_whitespace_backwards(body, key_start)
+        if trailing_key_end != key_end or body[comma - 1:comma] != ',':
+            return None
+
+        trailing.append((trailing_key, value))
+        end = __skip_whitespace_backwards(body, comma - 1)
+        if end <= start:
+            return None
+
+    if any(trailing_key == key for trailing_key, _ in trailing) or not __is_single_container(body[start:end]):
+        # e.g. further object members ending up within the deferred object would be missing from the envelope
+        return None
+
+    members[key] = _Deferred(body, start, end)
+    members.update(reversed(trailing))
+    return members
+
+
+def __decode_value(body: str, start: int) -> tuple[Any, int]:
+    value, end = _DECODER.raw_decode(body, start)
+    if type(value) is not str and json_codec() is not STDLIB_CODEC:
+        # the codecs differ e.g. for integers exceeding 64 bit
+        value = json_codec().loads(body[start:end])
+
+    return value, end
+
+
+def __is_single_container(value: str) -> bool:
+    """Whether the braces and brackets in `value` (ignoring strings) are balanced and the first one is closed only at its end."""
+    # only bytes methods are fast enough here, since bodies contain thousands of strings and containers
+    encoded = value.encode()
+    if b'\\' in encoded:
+        encoded = encoded.replace(b'\\\\', b'').replace(b'\\"', b'')
+
+    structure = encoded.translate(None, _NOT_STRUCTURE)
+    if structure.count(b'"') == 2 * structure.count(b'""'):
+        # no string contains brackets, since the quotes of all strings are adjacent
+        brackets = structure.translate(None, b'"')
+    else:
+        brackets = b''.join(structure.split(b'"')[::2])
+
+    if brackets[:1] != b'{' or brackets[-1:] != b'}':
+        return False
+
+    # the brackets within the first and last one are balanced if matching pairs can be removed until nothing is left
+    inner = brackets[1:-1]
+    while inner:
+        reduced = inner.replace(b'{}', b'').replace(b'[]', b'')
+        if len(reduced) == len(inner):
+            return False
+
+        inner = reduced
+
+    return True
+
+
+def __skip_whitespace_backwards(body: str, end: int) -> int:
+    while end > 0 and body[end - 1] in ' \t\n\r':
+        end -= 1
+
+    return end
+
+
+def __find_string_start(body: str, end: int) -> int:
+    """The position of the opening quote of the string ending at `end`, i.e. the closest preceding unescaped quote."""
+    quote = end - 1
+    while True:
+        quote = body.rfind('"', 0, quote)
+        if quote == -1:
+            raise ValueError(f'no string ends at {end=}')
+
+        backslashes = quote
+        while backslashes > 0 and body[backslashes - 1] == '\\':
+            backslashes -= 1
+
+        if (quote - backslashes) % 2 == 0:
+            return quote
+
+
+def __find_scalar_start(body: str, end: int) -> int:
+    start = end
+    while start > 0 and body[start - 1] in _SCALAR_CHARACTERS:
+        start -= 1
+
+    return start
@@ -0,0 +1,77 @@
+import itertools
+import os
+import threading
+import uuid
+from typing import Callable
+
+IdGenerator = Callable[[], str]
+"""Returns a new JSON-RPC request id on every call."""
+
+
+def uuid4_ids() -> IdGenerator:
+    """Random UUID4 ids (the default), unique across processes and runs."""
+    return lambda: str(uuid.uuid4())
+
+
+def counter_ids(start: int = 1) -> IdGenerator:
+    """Monotonically increasing numbers ('1', '2', ...), the cheapest ids, unique only within the generator."""
+    return map(str, itertools.count(start)).__next__
+
+
+def prefixed_counter_ids(prefix: str | None = None, start: int = 1) -> IdGenerator:
+    """Monotonically increasing numbers after a fixed prefix, which defaults to a random UUID4 (e.g. 'c2a3…-1', 'c2a3…-2', ...)."""
+    prefix = f'{uuid.uuid4()}-' if prefix is None else prefix
+    return map(prefix.__add__, map(str, itertools.count(start))).__next__
+
+
+def pooled_uuid4_ids(size: int = 1024) -> IdGenerator:
+    """UUID4 ids, pre-generated `size` at a time from a single random read (several times cheaper than `uuid4_ids()`)."""
+    if size < 1:
+        raise ValueError(f'{size=} must be positive')
+
+    # safe to call from several threads: popping an id is atomic and refilling the pool is locked
+    ids: list[str] = []
+    refill = threading.Lock()
+
+    def next_id() -> str:
+        while True:
+            try:
+                return ids.pop()
+            except IndexError:
+                with refill:
+                    if not ids:
+                        ids.extend(__uuid4_pool(size))
+
+    return next_id
+
+
+def __uuid4_pool(size: int) -> list[str]:
+    random = bytearray(os.urandom(16 * size))
+    for offset in range(0, len(random), 16):
+        # version 4 and RFC 4122 variant bits, as set by uuid.uuid4()
+        random[offset + 6] = random[offset + 6] & 0x0f | 0x40
+        random[offset + 8] = random[offset + 8] & 0x3f | 0x80
+
+    # hex encode the whole pool at once instead of formatting every UUID object
+    digits = random.hex()
+    return [
+        f'{digits[offset:offset + 8]}-{digits[offset + 8:offset + 12]}-{digits[offset + 12:offset + 16]}-{digits[offset + 16:offset + 20]}-{digits[offset + 20:offset + 32]}'
+        for offset in range(0, len(digits), 32)
+    ]
+
+
+__generator = uuid4_ids()
+
+
+def request_id() -> str:
+    """A new id from the generator currently used for JSON-RPC requests constructed without an explicit id."""
+    return __generator()
+
+
+def use_request_ids(generator: IdGenerator) -> None:
+    """
+    Selects the id generator for the whole process.
+    Load generators with their own id scheme can instead pass `id=generator()` to each `JsonRpcRequest`.
+    """
+    global __generator
+    __generator = generator
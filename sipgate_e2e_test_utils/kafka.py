@@ -1,7 +1,12 @@
 import asyncio
-from datetime import date, datetime
-
-from confluent_kafka import Producer, Consumer, TopicPartition, cimpl
+import functools
+import os
+from collections.abc import AsyncIterable, Iterable
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import cast
+
+from confluent_kafka import Producer, Consumer, TopicPartition, KafkaError, cimpl
 from confluent_kafka.schema_registry import SchemaRegistryClient
 from confluent_kafka.schema_registry.avro import AvroSerializer
 from confluent_kafka.serialization import SerializationContext, MessageField
@@ -15,6 +20,22 @@ SHARED_KAFKA_CLIENT_PROPS = {
     "ssl.ca.location": "/certs/ca-cert.pem",
 }
 
+DEFAULT_AVRO_SCHEMA_DIR = "/python-runner/e2e_tests/avro-schemata/"
+# how long publish_avro_records() waits for deliveries when the producer's queue is full
+BACKPRESSURE_INTERVAL = timedelta(milliseconds=10)
+
+
+@dataclass(frozen=True, slots=True)
+class DeliveryResult:
+    """The delivery report of a published record: its `partition` and `offset`, or the `error` it was not delivered with."""
+    error: KafkaError | None
+    partition: int | None
+    offset: int | None
+
+    @property
+    def delivered(self) -> bool:
+        return self.error is None
+
 
 def epoch_day(d: date) -> int:
     epoch_sec = datetime(year=d.year, month=d.month, day=d.day).timestamp()
@@ -45,14 +66,9 @@ def generic_source_part(db: str, table: str, created: datetime) -> dict:
     }
 
 
-def publish_avro_record(schema_registry_client: SchemaRegistryClient, producer: Producer, topic: str, key_schema_filename: str, key: dict[str, any], value_schema_filename: str, value: dict[str, any]) -> None:
-    with open("/python-runner/e2e_tests/avro-schemata/" + key_schema_filename) as f:
-        key_schema_str = f.read()
-    with open("/python-runner/e2e_tests/avro-schemata/" + value_schema_filename) as f:
-        value_schema_str = f.read()
-
-    avro_key_serializer = AvroSerializer(schema_registry_client, key_schema_str, conf={"auto.register.schemas": True})
-    avro_value_serializer = AvroSerializer(schema_registry_client, value_schema_str, conf={"auto.register.schemas": True})
+def publish_avro_record(schema_registry_client: SchemaRegistryClient, producer: Producer, topic: str, key_schema_filename: str, key: dict[str, any], value_schema_filename: str, value: dict[str, any], schema_dir: str | os.PathLike[str] = DEFAULT_AVRO_SCHEMA_DIR) -> None:
+    avro_key_serializer = avro_serializer(schema_registry_client, topic, key_schema_filename, schema_dir)
+    avro_value_serializer = avro_serializer(schema_registry_client, topic, value_schema_filename, schema_dir)
 
     producer.produce(
         topic=topic,
@@ -63,6 +79,63 @@ def publish_avro_record(schema_registry_client: SchemaRegistryClient, producer:
     producer.flush()
 
 
+async def publish_avro_records(schema_registry_client: SchemaRegistryClient, producer: Producer, topic: str, key_schema_filename: str, value_schema_filename: str, records: Iterable[tuple[dict[str, any], dict[str, any]]] | AsyncIterable[tuple[dict[str, any], dict[str, any]]], schema_dir: str | os.PathLike[str] = DEFAULT_AVRO_SCHEMA_DIR) -> list[DeliveryResult]:
+    """
+    Publishes the (key, value) `records` and flushes the producer once at the end, instead of after every record like `publish_avro_record()`.
+    When the producer's queue is full, its delivery reports are polled until there is room again.
+    Returns the delivery results in the order of the records.
+    """
+    avro_key_serializer = avro_serializer(schema_registry_client, topic, key_schema_filename, schema_dir)
+    avro_value_serializer = avro_serializer(schema_registry_client, topic, value_schema_filename, schema_dir)
+    results: list[DeliveryResult | None] = []
+
+    async def produce(key: dict[str, any], value: dict[str, any]) -> None:
+        serialized_key = avro_key_serializer(key, SerializationContext(topic, MessageField.KEY))
+        serialized_value = avro_value_serializer(value, SerializationContext(topic, MessageField.VALUE))
+        on_delivery = functools.partial(_record_delivery, results, len(results))
+        results.append(None)
+
+        while True:
+            try:
+                producer.produce(topic=topic, key=serialized_key, value=serialized_value, on_delivery=on_delivery)
+            except BufferError:
+                # waits for deliveries without blocking the event loop (e.g. an HttpRequestRecorder) meanwhile
+                producer.poll(0)
+                await asyncio.sleep(BACKPRESSURE_INTERVAL.total_seconds())
+            else:
+                break
+
+        # serves the delivery callbacks of the records produced so far and lets the event loop serve other work
+        producer.poll(0)
+        await asyncio.sleep(0)
+
+    if isinstance(records, AsyncIterable):
+        async for key, value in records:
+            await produce(key, value)
+    else:
+        for key, value in records:
+            await produce(key, value)
+
+    # flushing blocks until every record has got its delivery report, which must not stall the event loop
+    await asyncio.to_thread(producer.flush)
+
+    return cast(list[DeliveryResult], results)
+
+
+def _record_delivery(results: list[DeliveryResult | None], index: int, error: KafkaError | None, msg: cimpl.Message) -> None:
+    results[index] = DeliveryResult(error, msg.partition(), msg.offset()) if error is None else DeliveryResult(error, None, None)
+
+
+@functools.lru_cache(maxsize=256)
+def avro_serializer(schema_registry_client: SchemaRegistryClient, topic: str, schema_filename: str, schema_dir: str | os.PathLike[str] = DEFAULT_AVRO_SCHEMA_DIR) -> AvroSerializer:
+    """
+    The serializer for the schema in `schema_dir`/`schema_filename`, cached per registry client and topic.
+    So the schema file is read and the schema registered (or looked up) only once instead of for every record.
+    """
+    with open(os.path.join(schema_dir, schema_filename)) as f:
+        return AvroSerializer(schema_registry_client, f.read(), conf={"auto.register.schemas": True})
+
+
 async def likely_latest_msg_offset(consumer: Consumer, topic: str) -> int:
     offset = -1
     unchanged_for_iterations = 0
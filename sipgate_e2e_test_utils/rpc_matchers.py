@@ -1,29 +1,261 @@
 import json
-from typing import Callable
+from enum import Enum
+from typing import Any, Callable
+from weakref import WeakKeyDictionary
 
 from http_request_recorder import RecordedRequest
 
+from sipgate_e2e_test_utils.json_codec import json_codec
+from sipgate_e2e_test_utils.json_rpc import JsonRpcBatchRequest
+from sipgate_e2e_test_utils.xml_rpc import XmlRpcRequest
 
-def json_rpc(method: str) -> Callable[[RecordedRequest], bool]:
+# the <methodName> is expected within the first bytes of a body (after the XML declaration and <methodCall>)
+METHOD_NAME_SCAN_LIMIT = 4096
+
+__xml_rpc_method_names: WeakKeyDictionary[RecordedRequest, str | None] = WeakKeyDictionary()
+__xml_rpc_requests: WeakKeyDictionary[RecordedRequest, XmlRpcRequest | None] = WeakKeyDictionary()
+__json_bodies: WeakKeyDictionary[RecordedRequest, dict[str, Any] | None] = WeakKeyDictionary()
+__json_rpc_batches: WeakKeyDictionary[RecordedRequest, JsonRpcBatchRequest | None] = WeakKeyDictionary()
+
+
+class RpcProtocol(Enum):
+    JSON_RPC = 'json-rpc'
+    XML_RPC = 'xml-rpc'
+
+
+def json_rpc(method: str, params: Any = None) -> Callable[[RecordedRequest], bool]:
+    """
+    Matches JSON-RPC requests by method and optionally by `params`, which need to be contained in the request (see `matches_partially()`).
+    """
     def matcher(request: RecordedRequest) -> bool:
         if request.method != 'POST' or '/jsonrpc' != request.path.lower():
             return False
 
-        try:
-            parsed = json.loads(request.body)
-        except json.decoder.JSONDecodeError:
+        if method != json_rpc_method_name(request):
+            return False
+
+        return params is None or _matches_json_rpc_params(request, params)
+
+    return matcher
+
+
+def json_rpc_batch(method: str, params: Any = None) -> Callable[[RecordedRequest], bool]:
+    """
+    Matches JSON-RPC batches containing at least one valid request with the given method (and optionally `params`, see `json_rpc()`).
+    """
+    def matcher(request: RecordedRequest) -> bool:
+        if request.method != 'POST' or '/jsonrpc' != request.path.lower():
+            return False
+
+        batch = json_rpc_batch_request(request)
+        if batch is None:
             return False
 
-        return 'method' in parsed and method == parsed['method']
+        return any(method == rpc.method and (params is None or matches_partially(params, rpc.params)) for rpc in batch.valid())
 
     return matcher
 
 
-def xml_rpc(method: str) -> Callable[[RecordedRequest], bool]:
+def xml_rpc(method: str, members: dict[str, Any] | None = None) -> Callable[[RecordedRequest], bool]:
+    """
+    Matches XML-RPC requests by method name and optionally by `members`, which need to be contained in the request (see `matches_partially()`).
+    """
     def matcher(request: RecordedRequest) -> bool:
-        return (
-            'POST' == request.method and
-            '/rpc2' == request.path.lower() and
-            b'<methodName>' + method.encode() + b'</methodName>' in request.body)
+        if not (
+                'POST' == request.method and
+                '/rpc2' == request.path.lower() and
+                method == xml_rpc_method_name(request)):
+            return False
+
+        return members is None or _matches_xml_rpc_members(request, members)
 
     return matcher
+
+
+def matches_partially(expected: Any, actual: Any) -> bool:
+    """
+    Checks whether `expected` is contained in `actual`:
+    - dicts match if all expected keys are present and their values match partially (additional keys are ignored)
+    - lists match if they have the same length and all elements match partially
+    - callables are used as predicates for the actual value
+    - anything else needs to be equal
+    """
+    if callable(expected):
+        return bool(expected(actual))
+
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and all(key in actual and matches_partially(val, actual[key]) for key, val in expected.items())
+
+    if isinstance(expected, list):
+        return isinstance(actual, list) and len(expected) == len(actual) and all(map(matches_partially, expected, actual))
+
+    return bool(expected == actual)
+
+
+def json_body(request: RecordedRequest) -> dict[str, Any] | None:
+    """
+    Decodes a recorded JSON body (None if it is not a JSON object), without validating it as a JSON-RPC request.
+    The result is cached per recorded request, so matching by method and params decodes each body only once.
+    """
+    try:
+        return __json_bodies[request]
+    except KeyError:
+        pass
+
+    try:
+        parsed = json_codec().loads(request.body)
+    except json.JSONDecodeError:
+        parsed = None
+
+    if not isinstance(parsed, dict):
+        parsed = None
+
+    __json_bodies[request] = parsed
+    return parsed
+
+
+def json_rpc_batch_request(request: RecordedRequest) -> JsonRpcBatchRequest | None:
+    """Parses a recorded JSON-RPC batch (None if it is not a batch). The result is cached per recorded request."""
+    try:
+        return __json_rpc_batches[request]
+    except KeyError:
+        pass
+
+    try:
+        parsed: JsonRpcBatchRequest | None = JsonRpcBatchRequest.parse(request.body)
+    except Exception:
+        parsed = None
+
+    __json_rpc_batches[request] = parsed
+    return parsed
+
+
+def xml_rpc_request(request: RecordedRequest) -> XmlRpcRequest | None:
+    """Parses a recorded XML-RPC request (None if it is invalid). The result is cached per recorded request."""
+    try:
+        return __xml_rpc_requests[request]
+    except KeyError:
+        pass
+
+    try:
+        parsed: XmlRpcRequest | None = XmlRpcRequest.parse(request.body)
+    except Exception:
+        parsed = None
+
+    __xml_rpc_requests[request] = parsed
+    return parsed
+
+
+def _matches_json_rpc_params(request: RecordedRequest, params: Any) -> bool:
+    parsed = json_body(request)
+    return parsed is not None and 'params' in parsed and matches_partially(params, parsed['params'])
+
+
+def _matches_xml_rpc_members(request: RecordedRequest, members: dict[str, Any]) -> bool:
+    parsed = xml_rpc_request(request)
+    return parsed is not None and matches_partially(members, parsed.members)
+
+
+def json_rpc_method_name(request: RecordedRequest) -> str | None:
+    """
+    Extracts the `method` of a JSON body (None if there is none), which is not required to be an otherwise valid JSON-RPC request.
+    It is taken from the cached `json_body()`, so each body is decoded only once, even when params are matched as well.
+    """
+    parsed = json_body(request)
+    method_name = parsed.get('method') if parsed is not None else None
+    return method_name if isinstance(method_name, str) else None
+
+
+def xml_rpc_method_name(request: RecordedRequest) -> str | None:
+    """
+    Extracts the content of the first `<methodName>` without parsing the body, by scanning at most `METHOD_NAME_SCAN_LIMIT` bytes.
+    Names containing markup (entity or character references, CDATA, comments) are taken from the fully parsed body instead.
+    The result is cached per recorded request, so a recorder with many expectations scans each body only once.
+    """
+    try:
+        return __xml_rpc_method_names[request]
+    except KeyError:
+        pass
+
+    method_name = __scan_method_name(request.body)
+    if method_name is not None and ('&' in method_name or '<' in method_name):
+        parsed = xml_rpc_request(request)
+        method_name = parsed.method_name if parsed is not None else None
+
+    __xml_rpc_method_names[request] = method_name
+    return method_name
+
+
+def __scan_method_name(body: bytes) -> str | None:
+    start = body.find(b'<methodName>', 0, METHOD_NAME_SCAN_LIMIT)
+    if start == -1:
+        return None
+
+    start += len(b'<methodName>')
+    end = body.find(b'</methodName>', start, METHOD_NAME_SCAN_LIMIT)
+    if end == -1:
+        return None
+
+    try:
+        return body[start:end].decode()
+    except UnicodeDecodeError:
+        return None
+
+
+class RpcRouter:
+    """
+    Creates matchers for many RPC expectations (e.g. on one `HttpRequestRecorder`):
+    each recorded request is classified by (protocol, path, method) only once, every matcher then just compares its key.
+    Paths are case-insensitive and each path serves a single protocol.
+    """
+
+    def __init__(self) -> None:
+        self.__protocols: dict[str, RpcProtocol] = {}
+        self.__matchers: dict[tuple[RpcProtocol, str, str], Callable[[RecordedRequest], bool]] = {}
+        self.__routes: WeakKeyDictionary[RecordedRequest, tuple[RpcProtocol, str, str] | None] = WeakKeyDictionary()
+
+    def json_rpc(self, method: str, path: str = '/jsonrpc', params: Any = None) -> Callable[[RecordedRequest], bool]:
+        matcher = self.matcher(RpcProtocol.JSON_RPC, path, method)
+        if params is None:
+            return matcher
+
+        return lambda request: matcher(request) and _matches_json_rpc_params(request, params)
+
+    def xml_rpc(self, method: str, path: str = '/rpc2', members: dict[str, Any] | None = None) -> Callable[[RecordedRequest], bool]:
+        matcher = self.matcher(RpcProtocol.XML_RPC, path, method)
+        if members is None:
+            return matcher
+
+        return lambda request: matcher(request) and _matches_xml_rpc_members(request, members)
+
+    def matcher(self, protocol: RpcProtocol, path: str, method: str) -> Callable[[RecordedRequest], bool]:
+        path = path.lower()
+        if path not in self.__protocols:
+            self.__protocols[path] = protocol
+            # requests routed before this path was known need to be routed again
+            self.__routes.clear()
+        elif self.__protocols[path] != protocol:
+            raise ValueError(f'{path=} is already routed to {self.__protocols[path]}')
+
+        key = (protocol, path, method)
+        if key not in self.__matchers:
+            self.__matchers[key] = lambda request: key == self.route(request)
+
+        return self.__matchers[key]
+
+    def route(self, request: RecordedRequest) -> tuple[RpcProtocol, str, str] | None:
+        """Returns the (protocol, path, method) of a recorded request, or None if it does not match any known path."""
+        try:
+            return self.__routes[request]
+        except KeyError:
+            pass
+
+        route = None
+        path = request.path.lower()
+        protocol = self.__protocols.get(path) if request.method == 'POST' else None
+        if protocol is not None:
+            method = json_rpc_method_name(request) if protocol == RpcProtocol.JSON_RPC else xml_rpc_method_name(request)
+            route = None if method is None else (protocol, path, method)
+
+        self.__routes[request] = route
+        return route
@@ -0,0 +1,12 @@
+from typing import Protocol
+
+# bytes requested per read when parsing a stream
+CHUNK_SIZE = 64 * 1024
+
+
+class ChunkReader(Protocol):
+    """A body read in chunks, e.g. an aiohttp `StreamReader` (like `ClientResponse.content`) or an asyncio `StreamReader`."""
+
+    async def read(self, n: int = -1) -> bytes:
+        """Returns up to `n` bytes, b'' at the end of the body."""
+        ...
@@ -1,44 +1,358 @@
 import asyncio
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, asdict
 from datetime import timedelta
-from typing import Callable, Any
+from typing import Awaitable, Callable, Any, Iterable, Iterator
+
+# probes running `in_thread` at the same time, shared by all waits
+MAX_PROBE_THREADS = 4
+
+
+class ProbeTimeoutError(TimeoutError):
+    """Raised (or recorded as the failed attempt) when a single condition or asserter call takes longer than `probe_timeout`."""
+
+
+@dataclass(frozen=True, slots=True)
+class WaitRecord:
+    """
+    A finished wait: the waiting `function`, where it was called from (`call_site`, as 'file:line'), the `attempts` (probe calls),
+    the `elapsed` seconds, the `budget` in seconds (the timeout or, for attempt-based waits, the total interval between attempts)
+    and whether the wait `succeeded` or used up its budget.
+    """
+    function: str
+    call_site: str
+    attempts: int
+    elapsed: float
+    budget: float
+    succeeded: bool
+
+
+class WaitStatistics:
+    """Records of the waits of a test session (see `use_wait_statistics()`), reported as the slowest waits and those that used up their budget."""
+
+    def __init__(self) -> None:
+        self.__records: list[WaitRecord] = []
+
+    def record(self, record: WaitRecord) -> None:
+        self.__records.append(record)
+
+    def records(self) -> list[WaitRecord]:
+        return list(self.__records)
+
+    def slowest(self, top: int = 10) -> list[WaitRecord]:
+        return sorted(self.__records, key=lambda record: record.elapsed, reverse=True)[:top]
+
+    def exhausted(self) -> list[WaitRecord]:
+        return [record for record in self.__records if not record.succeeded]
+
+    def report(self, top: int = 10) -> dict[str, Any]:
+        """
+        The number of waits, the total time spent waiting, the `top` slowest waits and all waits that used up their budget, e.g.
+        {'waits': 3, 'elapsed': 1.25, 'slowest': [{'function': 'wait_until', 'call_site': 'test_x.py:12', ...}], 'exhausted': [...]}
+        """
+        return {
+            'waits': len(self.__records),
+            'elapsed': sum(record.elapsed for record in self.__records),
+            'slowest': [asdict(record) for record in self.slowest(top)],
+            'exhausted': [asdict(record) for record in self.exhausted()],
+        }
+
+    def json(self, top: int = 10) -> str:
+        return json.dumps(self.report(top), indent=2)
 
 
 async def wait_for_condition(
-        condition: Callable[[], bool], attempts: int = 5, interval: timedelta = timedelta(milliseconds=100)) -> None:
+        condition: Callable[[], Any], attempts: int = 5, interval: timedelta = timedelta(milliseconds=100),
+        probe_timeout: timedelta | None = None, in_thread: bool = False) -> None:
     if attempts < 1:
         raise ValueError('needs at least one attempt')
 
     if interval < timedelta(milliseconds=0):
         raise ValueError('interval cannot be negative')
 
-    attempt = 1
-    while condition() is False:
-        attempt += 1
+    if in_thread and probe_timeout is None:
+        raise ValueError('probes running in a thread need a probe_timeout, since they cannot be cancelled')
 
-        if attempt > attempts:
-            raise TimeoutError('timed out waiting for condition')
+    with _recorded('wait_for_condition', (attempts - 1) * interval.total_seconds()) as wait:
+        attempt = 1
+        while await _check(condition, _deadline_after(probe_timeout), in_thread) is False:
+            attempt += 1
 
-        await asyncio.sleep(interval.total_seconds())
+            if attempt > attempts:
+                raise TimeoutError('timed out waiting for condition')
+
+            wait.attempts = attempt
+            await asyncio.sleep(interval.total_seconds())
 
 
 async def wait_for_assertions(
-        asserter: Callable[[], Any], attempts: int = 5, interval: timedelta = timedelta(milliseconds=100)) -> None:
+        asserter: Callable[[], Any], attempts: int = 5, interval: timedelta = timedelta(milliseconds=100),
+        probe_timeout: timedelta | None = None, in_thread: bool = False) -> None:
     if attempts < 1:
         raise ValueError('needs at least one attempt')
 
     if interval < timedelta(milliseconds=0):
         raise ValueError('interval cannot be negative')
 
-    attempt = 1
-    while True:
-        try:
-            asserter()
-        except AssertionError as e:
-            attempt += 1
+    if in_thread and probe_timeout is None:
+        raise ValueError('probes running in a thread need a probe_timeout, since they cannot be cancelled')
 
-            if attempt > attempts:
-                raise e
+    with _recorded('wait_for_assertions', (attempts - 1) * interval.total_seconds()) as wait:
+        attempt = 1
+        while True:
+            try:
+                await _call(asserter, _deadline_after(probe_timeout), in_thread)
+            except (AssertionError, ProbeTimeoutError) as e:
+                attempt += 1
 
-            await asyncio.sleep(interval.total_seconds())
-        else:
+                if attempt > attempts:
+                    raise e
+
+                wait.attempts = attempt
+                await asyncio.sleep(interval.total_seconds())
+            else:
+                return
+
+
+async def wait_until(
+        condition: Callable[[], Any], timeout: timedelta = timedelta(seconds=1), initial_interval: timedelta = timedelta(microseconds=250),
+        max_interval: timedelta = timedelta(milliseconds=100), trigger: asyncio.Event | Awaitable[Any] | None = None,
+        probe_timeout: timedelta | None = None, in_thread: bool = False) -> None:
+    """
+    Checks the condition until it is truthy or `timeout` has passed (raising a `TimeoutError`), including the time spent checking it.
+    The interval between checks starts at `initial_interval` and doubles (with jitter) up to `max_interval`.
+    Setting the `trigger` event (or completing the awaitable) checks the condition again at once, e.g. when the system under test calls back.
+    Conditions may be coroutine functions; each call is cancelled after `probe_timeout` or at the deadline (counting as not met).
+    Blocking conditions (e.g. database or Kafka clients) can be run `in_thread` (see `MAX_PROBE_THREADS`), so the event loop keeps serving
+    other work. A hanging thread cannot be cancelled, but the wait still ends at the deadline. The threads are daemon threads,
+    so a hanging probe does not keep the process from exiting, but it occupies one of the `MAX_PROBE_THREADS` until it returns.
+    While all of them are occupied, attempts fail (like a timed out probe) without calling the probe.
+    """
+    with _recorded('wait_until', timeout.total_seconds()) as wait:
+        async def met(deadline: float) -> bool:
+            wait.attempts += 1
+            return bool(await _check(condition, deadline, in_thread))
+
+        if not await __poll(met, timeout, initial_interval, max_interval, trigger, probe_timeout):
+            raise TimeoutError('timed out waiting for condition')
+
+
+async def wait_until_asserted(
+        asserter: Callable[[], Any], timeout: timedelta = timedelta(seconds=1), initial_interval: timedelta = timedelta(microseconds=250),
+        max_interval: timedelta = timedelta(milliseconds=100), trigger: asyncio.Event | Awaitable[Any] | None = None,
+        probe_timeout: timedelta | None = None, in_thread: bool = False) -> None:
+    """Like `wait_until()`, until the asserter does not raise an `AssertionError` anymore (raising the last one on timeout)."""
+    error: AssertionError | None = None
+
+    with _recorded('wait_until_asserted', timeout.total_seconds()) as wait:
+        async def succeeds(deadline: float) -> bool:
+            nonlocal error
+            wait.attempts += 1
+            try:
+                await _call(asserter, deadline, in_thread)
+            except (AssertionError, ProbeTimeoutError) as e:
+                error = e
+                return False
+
+            return True
+
+        if not await __poll(succeeds, timeout, initial_interval, max_interval, trigger, probe_timeout):
+            assert error is not None
+            raise error
+
+
+async def wait_for_all(
+        conditions: Iterable[Callable[[], Any]], timeout: timedelta = timedelta(seconds=1),
+        initial_interval: timedelta = timedelta(microseconds=250), max_interval: timedelta = timedelta(milliseconds=100),
+        trigger: asyncio.Event | None = None, probe_timeout: timedelta | None = None,
+        in_thread: bool = False) -> None:
+    """
+    Waits for all conditions at the same time (see `wait_until()`), so it takes as long as the slowest one instead of their sum.
+    Raises a `TimeoutError` as soon as one of them times out, cancelling the others.
+    """
+    # the waits run in their own tasks, which cannot see the frame wait_for_all() was called from
+    token = __call_site.set(_call_site() if __statistics is not None else None)
+    try:
+        waits = [
+            asyncio.ensure_future(wait_until(condition, timeout, initial_interval, max_interval, trigger, probe_timeout, in_thread))
+            for condition in conditions
+        ]
+    finally:
+        __call_site.reset(token)
+
+    try:
+        await asyncio.gather(*waits)
+    except BaseException:
+        for wait in waits:
+            wait.cancel()
+        raise
+
+
+def use_wait_statistics(statistics: WaitStatistics | None) -> None:
+    """Records all following waits in `statistics` (e.g. for the whole test session), or stops recording them (`None`)."""
+    global __statistics
+    __statistics = statistics
+
+
+__statistics: WaitStatistics | None = None
+__call_site: contextvars.ContextVar[str | None] = contextvars.ContextVar('call_site', default=None)
+
+
+class _Wait:
+    __slots__ = ('attempts',)
+
+    def __init__(self) -> None:
+        self.attempts = 0
+
+
+@contextlib.contextmanager
+def _recorded(function: str, budget: float) -> Iterator[_Wait]:
+    statistics = __statistics
+    wait = _Wait()
+    if statistics is None:
+        yield wait
+        return
+
+    call_site = _call_site()
+    started = time.monotonic()
+    try:
+        yield wait
+    except (TimeoutError, AssertionError):
+        statistics.record(WaitRecord(function, call_site, max(wait.attempts, 1), time.monotonic() - started, budget, False))
+        raise
+
+    statistics.record(WaitRecord(function, call_site, max(wait.attempts, 1), time.monotonic() - started, budget, True))
+
+
+def _call_site() -> str:
+    call_site = __call_site.get()
+    if call_site is not None:
+        return call_site
+
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename in (__file__, contextlib.__file__):
+        frame = frame.f_back
+
+    return '<unknown>' if frame is None else f'{frame.f_code.co_filename}:{frame.f_lineno}'
+
+
+@functools.cache
+def _probe_threads() -> threading.Semaphore:
+    return threading.Semaphore(MAX_PROBE_THREADS)
+
+
+def _run_in_thread(probe: Callable[[], Any]) -> asyncio.Future[Any]:
+    # not a ThreadPoolExecutor, whose workers are joined on exit, so hanging probes would keep the process from exiting
+    # the slot is taken before starting a thread, so hanging probes neither pile up threads nor queue probes that run after their wait ended
+    if not _probe_threads().acquire(blocking=False):
+        raise ProbeTimeoutError(f'all {MAX_PROBE_THREADS} probe threads are busy')
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def complete(result: Any, error: BaseException | None) -> None:
+        if future.done():
             return
+
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def run() -> None:
+        try:
+            (result, error) = (probe(), None)
+        except BaseException as e:
+            (result, error) = (None, e)
+        finally:
+            _probe_threads().release()
+
+        try:
+            loop.call_soon_threadsafe(complete, result, error)
+        except RuntimeError:
+            # the loop was closed in the meantime, nobody waits for the result anymore
+            pass
+
+    threading.Thread(target=run, name='probe', daemon=True).start()
+    return future
+
+
+async def _check(condition: Callable[[], Any], deadline: float | None, in_thread: bool) -> Any:
+    try:
+        return await _call(condition, deadline, in_thread)
+    except ProbeTimeoutError:
+        return False
+
+
+async def _call(probe: Callable[[], Any], deadline: float | None, in_thread: bool) -> Any:
+    # coroutine functions do not block the event loop, so they are not worth a thread
+    if in_thread and not inspect.iscoroutinefunction(probe):
+        result = _run_in_thread(probe)
+    else:
+        result = probe()
+
+    if not inspect.isawaitable(result):
+        return result
+
+    try:
+        async with asyncio.timeout_at(deadline) as scope:
+            return await result
+    except TimeoutError:
+        if scope.expired():
+            raise ProbeTimeoutError('timed out waiting for probe') from None
+        raise
+
+
+def _deadline_after(timeout: timedelta | None) -> float | None:
+    return None if timeout is None else asyncio.get_running_loop().time() + timeout.total_seconds()
+
+
+async def __poll(
+        probe: Callable[[float], Awaitable[bool]], timeout: timedelta, initial_interval: timedelta, max_interval: timedelta,
+        trigger: asyncio.Event | Awaitable[Any] | None, probe_timeout: timedelta | None) -> bool:
+    if timeout < timedelta(milliseconds=0):
+        raise ValueError('timeout cannot be negative')
+
+    if initial_interval <= timedelta(milliseconds=0) or max_interval < initial_interval:
+        raise ValueError('intervals must be positive and initial_interval cannot exceed max_interval')
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout.total_seconds()
+    interval = initial_interval.total_seconds()
+
+    # awaitables (e.g. coroutines) are awaited once in the background, events are waited for whenever they are not set
+    wake_up = None if trigger is None or isinstance(trigger, asyncio.Event) else asyncio.ensure_future(trigger)
+    try:
+        while True:
+            probe_deadline = _deadline_after(probe_timeout)
+            if await probe(deadline if probe_deadline is None else min(deadline, probe_deadline)):
+                return True
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+
+            await __pause(min(interval * random.uniform(0.5, 1), remaining), trigger if wake_up is None else wake_up)
+            interval = min(interval * 2, max_interval.total_seconds())
+    finally:
+        if wake_up is not None and wake_up is not trigger:
+            wake_up.cancel()
+
+
+async def __pause(seconds: float, trigger: asyncio.Event | asyncio.Future[Any] | Awaitable[Any] | None) -> None:
+    if isinstance(trigger, asyncio.Event) and not trigger.is_set():
+        waiter = asyncio.ensure_future(trigger.wait())
+        await asyncio.wait([waiter], timeout=seconds)
+        waiter.cancel()
+    elif isinstance(trigger, asyncio.Future) and not trigger.done():
+        await asyncio.wait([trigger], timeout=seconds)
+    else:
+        await asyncio.sleep(seconds)
@@ -1,17 +1,23 @@
 import base64
+import io
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Any, Callable
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, Sequence
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element
+from xml.sax.saxutils import escape
 
+from sipgate_e2e_test_utils.streams import ChunkReader, CHUNK_SIZE
 
-@dataclass
+
+@dataclass(slots=True)
 class XmlRpcRequest:
     """
-    types not implemented (as not widely used for requests):
+    types not implemented (as not widely used for requests), but can be added using `register_type()`:
     - double
     - datetime.iso8601
+    - nil
     """
 
     method_name: str
@@ -24,8 +30,15 @@ class XmlRpcRequest:
     def parse(body: str | bytes) -> 'XmlRpcRequest':
         return _parse_xml_rpc_request(body)
 
-    def serialize(self) -> str:
-        return _serialize_xml_rpc_request(self)
+    def serialize(self, compact: bool = False) -> str:
+        """
+        Indented for readability, or without any whitespace between the elements if `compact`.
+        `serialize_bytes()` returns the same document encoded as UTF-8, also for responses.
+        """
+        return _serialize_xml_rpc_request(self, compact)
+
+    def serialize_bytes(self, compact: bool = False) -> bytes:
+        return _serialize_xml_rpc_request(self, compact).encode()
 
 
 class XmlRpcResponseType(Enum):
@@ -33,12 +46,13 @@ class XmlRpcResponseType(Enum):
     ERROR = 'error'
 
 
-@dataclass
+@dataclass(slots=True)
 class XmlRpcResponse:
     """
-    types not implemented (as not widely used for responses):
+    types not implemented (as not widely used for responses), but can be added using `register_type()`:
     - double
     - datetime.iso8601
+    - nil
     """
     type: XmlRpcResponseType
     fault: tuple[int, str]
@@ -56,13 +70,56 @@ class XmlRpcResponse:
     def parse(body: str | bytes) -> 'XmlRpcResponse':
         return _parse_xml_rpc_response(body)
 
-    def serialize(self) -> str:
-        return _serialize_xml_rpc_response(self)
+    @staticmethod
+    async def parse_stream(reader: ChunkReader) -> 'XmlRpcResponse':
+        """Parses a body chunk by chunk while reading it, so only the element tree is built in memory (instead of also holding the whole body)."""
+        return await _parse_xml_rpc_response_stream(reader)
+
+    def serialize(self, compact: bool = False) -> str:
+        return _serialize_xml_rpc_response(self, compact)
+
+    def serialize_bytes(self, compact: bool = False) -> bytes:
+        return _serialize_xml_rpc_response(self, compact).encode()
+
+    def freeze(self) -> 'FrozenXmlRpcResponse':
+        return FrozenXmlRpcResponse(self.type, self.fault, _freeze(self.members))
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} fault={self.fault} members={self.members}>"
 
 
+@dataclass(frozen=True, slots=True)
+class FrozenXmlRpcResponse:
+    """
+    Immutable variant of an `XmlRpcResponse` (see `XmlRpcResponse.freeze()`), members are read-only copies (mappings and tuples).
+    Intended for canned responses, e.g. returned many times by an `HttpRequestRecorder`: each format is serialized only once.
+    Frozen responses are equal if the responses they were frozen from are equal (regardless of the order of members), and hashable.
+    """
+    type: XmlRpcResponseType
+    fault: tuple[int, str]
+    members: Mapping[str, Any]
+    _serialized: dict[bool, str] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _encoded: dict[bool, bytes] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def serialize(self, compact: bool = False) -> str:
+        if compact not in self._serialized:
+            self._serialized[compact] = _serialize_xml_rpc_response(self, compact)
+
+        return self._serialized[compact]
+
+    def serialize_bytes(self, compact: bool = False) -> bytes:
+        if compact not in self._encoded:
+            self._encoded[compact] = self.serialize(compact).encode()
+
+        return self._encoded[compact]
+
+    def __hash__(self) -> int:
+        return hash((self.type, self.fault, _hashable(self.members)))
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} fault={self.fault} members={dict(self.members)}>"
+
+
 def _parse_xml_rpc_request(body: str | bytes) -> XmlRpcRequest:
     root = ElementTree.fromstring(body)
     if root.tag != 'methodCall':
@@ -73,26 +130,49 @@ def _parse_xml_rpc_request(body: str | bytes) -> XmlRpcRequest:
         raise ValueError("Expected to find non-empty '<methodName>'")
 
     members = {}
-    for member_node in root.findall('params/param/value/struct/member'):
+    for member_node in root.iterfind('params/param/value/struct/member'):
         key, val = __parse_member(member_node)
         members[key] = val
 
     return XmlRpcRequest(method_name.text, members)
 
 
-def _serialize_xml_rpc_request(request: XmlRpcRequest) -> str:
-    root_param = '' if request.members == {} else f'<param><value>{__serialize_struct(request.members)}</value></param>'
+def _serialize_xml_rpc_request(request: XmlRpcRequest, compact: bool = False) -> str:
+    out = io.StringIO()
+    write = out.write
+    separator = '' if compact else '\n'
 
-    # TODO: omit whitespace?
-    return f"""<?xml version="1.0"?>
-        <methodCall>
-            <methodName>{request.method_name}</methodName>
-            <params>{root_param}</params>
-        </methodCall>"""
+    write('<?xml version="1.0"?>')
+    write(__indentation(compact, 8))
+    write('<methodCall>')
+    write(__indentation(compact, 12))
+    write(f'<methodName>{__escape(request.method_name)}</methodName>')
+    write(__indentation(compact, 12))
+    write('<params>')
+    if request.members != {}:
+        write('<param><value>')
+        __write_struct(request.members, write, separator)
+        write('</value></param>')
+    write('</params>')
+    write(__indentation(compact, 8))
+    write('</methodCall>')
+
+    return out.getvalue()
 
 
 def _parse_xml_rpc_response(body: str | bytes) -> XmlRpcResponse:
-    root = ElementTree.fromstring(body)
+    return __response_from_element(ElementTree.fromstring(body))
+
+
+async def _parse_xml_rpc_response_stream(reader: ChunkReader) -> XmlRpcResponse:
+    parser = ElementTree.XMLParser()
+    while chunk := await reader.read(CHUNK_SIZE):
+        parser.feed(chunk)
+
+    return __response_from_element(parser.close())
+
+
+def __response_from_element(root: Element) -> XmlRpcResponse:
     if root.tag != 'methodResponse':
         raise ValueError("Expecting root tag to be '<methodResponse>'")
 
@@ -110,7 +190,7 @@ def _parse_xml_rpc_response(body: str | bytes) -> XmlRpcResponse:
     return XmlRpcResponse(response_type, fault, members)
 
 
-def _serialize_xml_rpc_response(response: XmlRpcResponse) -> str:
+def _serialize_xml_rpc_response(response: XmlRpcResponse | FrozenXmlRpcResponse, compact: bool = False) -> str:
     (fault_code, fault_string) = response.fault
     params = dict(response.members, **{
         'faultCode': fault_code,
@@ -118,14 +198,113 @@ def _serialize_xml_rpc_response(response: XmlRpcResponse) -> str:
     })
 
     if response.type == XmlRpcResponseType.RESULT:
-        wrapper = '<params><param><value>{}</value></param></params>'
+        prefix, suffix = '<params><param><value>', '</value></param></params>'
+    else:
+        prefix, suffix = '<fault><value>', '</value></fault>'
+
+    out = io.StringIO()
+    write = out.write
+    write('<?xml version="1.0"?>')
+    write(__indentation(compact, 12))
+    write('<methodResponse>')
+    write(__indentation(compact, 16))
+    write(prefix)
+    __write_struct(params, write, '' if compact else '\n')
+    write(suffix)
+    write(__indentation(compact, 12))
+    write('</methodResponse>')
+
+    return out.getvalue()
+
+
+def __indentation(compact: bool, width: int) -> str:
+    return '' if compact else '\n' + ' ' * width
+
+
+def __write_struct(struct: Mapping[str, Any], write: Callable[[str], Any], separator: str) -> None:
+    write('<struct>')
+    leading = ''
+    for name, value in struct.items():
+        if value is None and type(None) not in _VALUE_SERIALIZERS:
+            # omitted unless a <nil/> type is registered
+            write(leading)
+        elif type(value) in _STRUCT_TYPES or type(value) in _ARRAY_TYPES:
+            write(f'{leading}<member><name>{__escape(name)}</name>')
+            __write_value(value, write, separator)
+            write('</member>')
+        else:
+            write(f'{leading}<member><name>{__escape(name)}</name><value>{__serialize_scalar(value)}</value></member>')
+
+        leading = separator
+    write('</struct>')
+
+
+def __write_array(array: Sequence[Any], write: Callable[[str], Any], separator: str) -> None:
+    write('<array><data>')
+    leading = ''
+    for value in array:
+        write(leading)
+        __write_value(value, write, separator)
+        leading = separator
+    write('</data></array>')
+
+
+def __write_value(value: Any, write: Callable[[str], Any], separator: str) -> None:
+    if type(value) in _STRUCT_TYPES:
+        write('<value>')
+        __write_struct(value, write, separator)
+        write('</value>')
+    elif type(value) in _ARRAY_TYPES:
+        write('<value>')
+        __write_array(value, write, separator)
+        write('</value>')
     else:
-        wrapper = '<fault><value>{}</value></fault>'
+        write(f'<value>{__serialize_scalar(value)}</value>')
+
+
+def __serialize_scalar(value: Any) -> str:
+    try:
+        val_mapper = _VALUE_SERIALIZERS[type(value)]
+    except KeyError:
+        raise NotImplementedError(f'unsupported data type ({type(value)}) when serializing {value}')
+
+    return val_mapper(value)
+
+
+def __escape(text: str) -> str:
+    return escape(text) if '&' in text or '<' in text or '>' in text else text
+
+
+_STRUCT_TYPES = (dict, MappingProxyType)
+_ARRAY_TYPES = (list, tuple)
+
 
-    return f"""<?xml version="1.0"?>
-            <methodResponse>
-                {wrapper.format(__serialize_struct(params))}
-            </methodResponse>"""
+def _freeze(value: Any) -> Any:
+    if type(value) in _STRUCT_TYPES:
+        return MappingProxyType({key: _freeze(val) for key, val in value.items()})
+
+    if type(value) in _ARRAY_TYPES:
+        return tuple(_freeze(val) for val in value)
+
+    return value
+
+
+def _hashable(value: Any) -> Any:
+    """A hashable equivalent of a frozen value: mappings become sets of their items, so the order of members does not matter."""
+    if type(value) in _STRUCT_TYPES:
+        return frozenset((key, _hashable(val)) for key, val in value.items())
+
+    if type(value) in _ARRAY_TYPES:
+        return tuple(_hashable(val) for val in value)
+
+    return value
+
+
+_VALUE_SERIALIZERS: dict[type, Callable[[Any], str]] = {
+    int: lambda val: f'<i4>{val}</i4>',
+    str: lambda val: f'<string>{__escape(val)}</string>',
+    bool: lambda val: f'<boolean>{int(val)}</boolean>',
+}
 
 
 def __parse_member(node: Element) -> tuple[str, Any]:
@@ -150,82 +329,63 @@ def __parse_value(node: Element) -> Any:
         # it is allowed to omit the <string></string> type
         return '' if node.text is None else node.text
 
-    val_parsers: dict[str, Callable[[Element], Any]] = {
-        'int': lambda n: int('' if n.text is None else n.text),
-        'i4': lambda n: int('' if n.text is None else n.text),
-        'boolean': lambda n: __parse_boolean(n.text),
-        'string': lambda n: '' if n.text is None else n.text,
-        'struct': lambda n: __parse_struct(n),
-        'array': lambda n: __parse_array(n),
-        'base64': lambda n: b'' if n.text is None else base64.b64decode(n.text),
-    }
-
-    try:
-        parser = val_parsers[typed_value.tag]
-    except KeyError:
-        raise NotImplementedError(f"Unsupported type '<{typed_value.tag}>'")
+    tag = typed_value.tag
+    if tag in _VALUE_PARSERS:
+        (parse, argument) = (_VALUE_PARSERS[tag], typed_value.text)
+    elif tag == 'struct':
+        (parse, argument) = (__parse_struct, typed_value)
+    elif tag == 'array':
+        (parse, argument) = (__parse_array, typed_value)
+    else:
+        raise NotImplementedError(f"Unsupported type '<{tag}>'")
 
     try:
-        return parser(typed_value)
+        return parse(argument)
     except Exception:
-        raise ValueError(f"Invalid value '{typed_value.text}' for <{typed_value.tag}>")
-
-
-def __parse_boolean(text: str | None) -> bool:
-    if text == '0':
-        return False
-
-    if text == '1':
-        return True
-
-    raise ValueError(f"expected '{text}' to be '0' or '1'")
+        raise ValueError(f"Invalid value '{typed_value.text}' for <{tag}>")
 
 
 def __parse_array(node: Element) -> list[Any]:
     assert node.tag == 'array', f"expected 'array', but got {node.tag=}"
-    array_values = node.findall('data/value')
 
-    return [__parse_value(struct_node) for struct_node in array_values]
+    return [__parse_value(value_node) for value_node in node.iterfind('data/value')]
 
 
 def __parse_struct(node: Element) -> dict[str, Any]:
     assert node.tag == 'struct', f"expected 'struct', but got {node.tag=}"
-    member_nodes = node.findall('member')
-
-    return {k: v for k, v in map(__parse_member, member_nodes)}
-
 
-def __serialize_struct(struct: dict[str, Any]) -> str:
-    members = [__serialize_member(key, struct[key]) for key in struct]
+    return dict(map(__parse_member, node.iterfind('member')))
 
-    return f'<struct>{"\n".join(members)}</struct>'
 
+def __parse_boolean(text: str | None) -> bool:
+    if text == '0':
+        return False
 
-def __serialize_array(array: list[Any]) -> str:
-    values = [__serialize_value(val) for val in array]
-
-    return f'<array><data>{"\n".join(values)}</data></array>'
+    if text == '1':
+        return True
 
+    raise ValueError(f"expected '{text}' to be '0' or '1'")
 
-def __serialize_member(name: str, value: Any) -> str:
-    if value is None:
-        return ''  # TODO: test
 
-    return f"<member><name>{name}</name>{__serialize_value(value)}</member>"
+_VALUE_PARSERS: dict[str, Callable[[str | None], Any]] = {
+    'int': lambda text: int('' if text is None else text),
+    'i4': lambda text: int('' if text is None else text),
+    'boolean': lambda text: __parse_boolean(text),
+    'string': lambda text: '' if text is None else text,
+    'base64': lambda text: b'' if text is None else base64.b64decode(text),
+}
 
 
-def __serialize_value(value: Any) -> str:
-    val_mappers: dict[type, Callable[[Any], str]] = {
-        int: lambda val: f'<i4>{val}</i4>',
-        str: lambda val: f'<string>{val}</string>',
-        bool: lambda val: f'<boolean>{val}</boolean>',
-        dict: lambda val: __serialize_struct(value),
-        list: lambda val: __serialize_array(value)
-    }
+def register_type(tag: str, value_type: type, parse: Callable[[str | None], Any], serialize: Callable[[Any], str]) -> None:
+    """
+    Registers an additional type for parsing and serialization, for example:
+    `register_type('double', float, lambda text: float('' if text is None else text), repr)`
 
-    try:
-        val_mapper = val_mappers[type(value)]
-    except KeyError:
-        raise NotImplementedError(f'unsupported data type ({type(value)}) when serializing {value}')
+    `parse` receives the text of the `<tag>` element (None if empty), `serialize` returns the text to be put into it.
+    Values of exactly `value_type` (no subclasses) are serialized as `<tag>`.
+    """
+    if tag in ('struct', 'array') or value_type in _STRUCT_TYPES or value_type in _ARRAY_TYPES:
+        raise ValueError(f"cannot replace structured type '<{tag}>' ({value_type})")
 
-    return f"<value>{val_mapper(value)}</value>"
+    _VALUE_PARSERS[tag] = parse
+    _VALUE_SERIALIZERS[value_type] = lambda val: f'<{tag}>{serialize(val)}</{tag}>'
@@ -0,0 +1,11 @@
+class ChunkedReader:
+    """Returns the body in chunks of at most `chunk_size` bytes, like a `StreamReader` receiving them one by one."""
+
+    def __init__(self, body: bytes, chunk_size: int) -> None:
+        self.chunks = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)]
+
+    async def read(self, n: int = -1) -> bytes:
+        if n == 0 or not self.chunks:
+            return b''
+
+        return self.chunks.pop(0)
@@ -1,10 +1,16 @@
 import asyncio
+import os
+import socket
+import time
 import unittest
 from asyncio import create_task
+from unittest.mock import Mock, patch
 
-from aiohttp import web, ClientSession
+from aiohttp import web, ClientSession, ClientConnectionError
+from prometheus_client.parser import text_string_to_metric_families
 
-from sipgate_e2e_test_utils.jobd import JobD
+from sipgate_e2e_test_utils.jobd import JobD, SharedJobD, worker_port, jobd_functions_xml, JobTimings, JobTiming, JobResult, _parse_update_event, \
+    _resolve_port
 
 from sipgate_e2e_test_utils.xml_rpc import XmlRpcRequest, XmlRpcResponse
 
@@ -17,6 +23,60 @@ class TestJobD(unittest.IsolatedAsyncioTestCase):
 
             self.assertIn('jobd.updateEvent', await response.text())
 
+    async def test_serves_functions_xml_repeatedly(self):
+        any_port = 42
+        async with (JobD('localhost', any_port), ClientSession() as http):
+            for _ in range(150):
+                response = await http.get('http://localhost:8777/functions.xml')
+
+                self.assertEqual(jobd_functions_xml(), await response.read())
+
+    async def test_listens_on_free_port(self):
+        any_port = 42
+        async with (JobD('localhost', any_port, port=0) as jobd, ClientSession() as http):
+            self.assertNotEqual(8777, jobd.port)
+            self.assertEqual(f'http://{socket.gethostname()}:{jobd.port}/RPC2', jobd.notification_url)
+
+            response = await http.get(f'http://localhost:{jobd.port}/functions.xml')
+
+            self.assertIn('jobd.updateEvent', await response.text())
+
+    async def test_picks_another_free_port_if_taken_before_listening(self):
+        any_port = 42
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as taken:
+            taken.bind(('', 0))
+            taken.listen()
+            taken_port = taken.getsockname()[1]
+
+            with patch('sipgate_e2e_test_utils.jobd._resolve_port', side_effect=[taken_port, _resolve_port(0)]):
+                jobd = JobD('localhost', any_port, port=0)
+                self.assertEqual(taken_port, jobd.port)
+
+                async with jobd, ClientSession() as http:
+                    self.assertNotEqual(taken_port, jobd.port)
+                    self.assertEqual(f'http://{socket.gethostname()}:{jobd.port}/RPC2', jobd.notification_url)
+
+                    response = await http.get(f'http://localhost:{jobd.port}/functions.xml')
+
+                    self.assertEqual(200, response.status)
+
+    async def test_does_not_replace_fixed_port_if_taken(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as taken:
+            taken.bind(('', 0))
+            taken.listen()
+
+            with self.assertRaises(OSError):
+                async with JobD('localhost', 42, port=taken.getsockname()[1]):
+                    pass
+
+    def test_worker_port(self):
+        with patch.dict(os.environ, {'PYTEST_XDIST_WORKER': 'gw3'}):
+            self.assertEqual(8780, worker_port())
+            self.assertEqual(9003, worker_port(base=9000))
+
+        with patch.dict(os.environ, clear=True):
+            self.assertEqual(8777, worker_port())
+
     async def test_returns_success(self):
         mock_service = MockService(46968)
         await mock_service.start()
@@ -26,12 +86,135 @@ class TestJobD(unittest.IsolatedAsyncioTestCase):
 
             self.assertIn(b'any_value', job_result)
 
+            [timing] = jobd.timings.timings('any_job')
+            self.assertGreaterEqual(timing.notification, 0.25)
+            self.assertAlmostEqual(timing.total, timing.trigger + timing.notification)
+
+        await mock_service.stop()
+
+    async def test_returns_parsed_result(self):
+        mock_service = MockService(46968)
+        await mock_service.start()
+
+        async with JobD('localhost', mock_service.port) as jobd:
+            with patch('sipgate_e2e_test_utils.rpc_matchers.XmlRpcRequest.parse', wraps=XmlRpcRequest.parse) as parse:
+                job_result = await jobd.trigger_job('any_job')
+
+                self.assertEqual(1, len([call for call in parse.call_args_list if 'jobd.updateEvent' in str(call.args[0])]))
+
+            self.assertEqual(('any_system', 'any_job', 'success'), (job_result.system_name, job_result.event_name, job_result.status))
+            self.assertEqual('any_value', job_result.members['any_field'])
+            self.assertEqual(jobd.timings.timings('any_job'), [job_result.timing])
+
+        await mock_service.stop()
+
+    def test_result_requires_update_event(self):
+        with self.assertRaises(ValueError):
+            JobResult.from_request(XmlRpcRequest('cron.triggerJob', {'status': 'success'}))
+
+    def test_result_is_parsed_from_returned_body(self):
+        returned = XmlRpcRequest('jobd.updateEvent', {'uniqueid': 'second', 'status': 'success'}).serialize_bytes()
+        first_matched = Mock(body=XmlRpcRequest('jobd.updateEvent', {'uniqueid': 'first', 'status': 'success'}).serialize_bytes())
+
+        self.assertEqual('second', _parse_update_event(returned, first_matched).members['uniqueid'])
+        self.assertEqual('second', _parse_update_event(returned, Mock(body=returned)).members['uniqueid'])
+        self.assertEqual('second', _parse_update_event(returned, None).members['uniqueid'])
+
+    async def test_triggers_jobs_concurrently(self):
+        mock_service = MockService(46968)
+        await mock_service.start()
+
+        async with JobD('localhost', mock_service.port) as jobd:
+            job_names = ['slow_job', 'any_job', 'slow_job', 'other_job']
+            start = time.monotonic()
+            job_results = await jobd.trigger_jobs(job_names, concurrency=4)
+            elapsed = time.monotonic() - start
+
+            # sequentially, the two slow jobs alone would take 1s
+            self.assertLess(elapsed, 1.0)
+            self.assertEqual(4, mock_service.max_jobs_in_flight)
+
+            self.assertEqual(job_names, [XmlRpcRequest.parse(job_result).members['eventName'] for job_result in job_results])
+            self.assertEqual(4, len({XmlRpcRequest.parse(job_result).members['uniqueid'] for job_result in job_results}))
+
         await mock_service.stop()
 
+    async def test_shares_recorder_and_session(self):
+        mock_service = MockService(46968)
+        await mock_service.start()
+
+        async with SharedJobD() as shared:
+            for _ in range(2):
+                async with shared.jobd('localhost', mock_service.port) as jobd:
+                    self.assertIs(shared.recorder, jobd.recorder)
+                    self.assertIs(shared.session, jobd.session)
+
+                    job_result = await jobd.trigger_job_and_record_answer('any_job')
+
+                    self.assertIn(b'any_value', job_result)
+
+            self.assertFalse(shared.session.closed)
+
+        self.assertTrue(shared.session.closed)
+        await mock_service.stop()
+
+    async def test_shared_expectations_end_with_context(self):
+        async with SharedJobD() as shared:
+            async with shared.jobd('localhost', 42) as jobd:
+                with self.assertRaises(ClientConnectionError):
+                    await jobd.trigger_job_and_record_answer('any_job')
+
+            async with ClientSession() as http:
+                response = await http.post(jobd.notification_url, data=XmlRpcRequest('jobd.updateEvent', {}).serialize_bytes())
+
+                self.assertNotEqual(200, response.status)
+
+    async def test_shared_expectations_do_not_consume_requests_of_later_contexts(self):
+        mock_service = MockService(46968)
+        await mock_service.start()
+
+        async with SharedJobD() as shared:
+            # the expectation of the failed trigger is never met and matches any jobd.updateEvent
+            async with shared.jobd('localhost', 42) as jobd:
+                with self.assertRaises(ClientConnectionError):
+                    await jobd.trigger_job_and_record_answer('any_job')
+
+            async with shared.jobd('localhost', mock_service.port) as jobd:
+                job_result = await jobd.trigger_job_and_record_answer('any_job', timeout=2)
+
+                self.assertIn(b'any_value', job_result)
+
+        await mock_service.stop()
+
+
+class TestJobTimings(unittest.TestCase):
+    def setUp(self):
+        self.timings = JobTimings()
+        for total in range(1, 101):
+            self.timings.record('any_job', JobTiming(0.01, total - 0.01, total))
+        self.timings.record('other "job"', JobTiming(0.5, 1.5, 2))
+
+    def test_summary(self):
+        summary = self.timings.summary()
+
+        self.assertEqual({'count': 100, 'p50': 50.5, 'p95': 95.05, 'p99': 99.01}, {key: round(value, 2) for key, value in summary['any_job']['total'].items()})
+        self.assertEqual({'count': 1, 'p50': 0.5, 'p95': 0.5, 'p99': 0.5}, summary['other "job"']['trigger'])
+
+    def test_prometheus(self):
+        [family] = text_string_to_metric_families(self.timings.prometheus())
+
+        self.assertEqual(('jobd_job_duration_seconds', 'summary'), (family.name, family.type))
+        samples = {(sample.name, sample.labels.get('job'), sample.labels.get('phase'), sample.labels.get('quantile')): sample.value for sample in family.samples}
+        self.assertAlmostEqual(99.01, samples[('jobd_job_duration_seconds', 'any_job', 'total', '0.99')])
+        self.assertEqual(100, samples[('jobd_job_duration_seconds_count', 'any_job', 'notification', None)])
+        self.assertEqual(2, samples[('jobd_job_duration_seconds_sum', 'other "job"', 'total', None)])
+
 
 class MockService:
     def __init__(self, port: int) -> None:
         self.port = port
+        self.jobs_in_flight = 0
+        self.max_jobs_in_flight = 0
 
         app = web.Application()
         app.add_routes([web.post('/RPC2', self.__handle_request)])
@@ -46,17 +229,25 @@ class MockService:
         xml_rpc_request = XmlRpcRequest.parse(await request.text())
         assert 'cron.triggerJob' == xml_rpc_request.method_name
 
-        create_task(self.__send_result_to_jobd_after_some_time(xml_rpc_request.members['notificationUrl']))
+        self.jobs_in_flight += 1
+        self.max_jobs_in_flight = max(self.max_jobs_in_flight, self.jobs_in_flight)
+        create_task(self.__send_result_to_jobd_after_some_time(xml_rpc_request.members))
 
         return web.Response(status=200, body=XmlRpcResponse.result(200, 'OK').serialize())
 
-    async def __send_result_to_jobd_after_some_time(self, notification_url: str):
-        await asyncio.sleep(0.25)
+    async def __send_result_to_jobd_after_some_time(self, members: dict):
+        await asyncio.sleep(0.5 if members['jobName'].startswith('slow') else 0.25)
 
         async with ClientSession() as http:
-            await http.post(notification_url, data=XmlRpcRequest('jobd.updateEvent', {
-                'any_field': 'any_value'
+            await http.post(members['notificationUrl'], data=XmlRpcRequest('jobd.updateEvent', {
+                'any_field': 'any_value',
+                'systemName': 'any_system',
+                'eventName': members['jobName'],
+                'uniqueid': str(members['uniqueid']),
+                'status': 'success'
             }).serialize())
 
+        self.jobs_in_flight -= 1
+
     async def stop(self):
         await self.runner.cleanup()
@@ -0,0 +1,78 @@
+import json
+from unittest import TestCase, skipIf
+
+from sipgate_e2e_test_utils.json_codec import json_codec, use_json_codec, STDLIB_CODEC, ORJSON_CODEC, JsonCodec
+from sipgate_e2e_test_utils.json_rpc import JsonRpcRequest, JsonRpcResponse, ParseError, V20
+
+
+class TestJsonCodec(TestCase):
+    def setUp(self):
+        self.default_codec = json_codec()
+
+    def tearDown(self):
+        use_json_codec(self.default_codec)
+
+    def test_defaults_to_stdlib(self):
+        self.assertIs(STDLIB_CODEC, self.default_codec)
+
+    def test_select_by_name(self):
+        use_json_codec('json')
+
+        self.assertIs(STDLIB_CODEC, json_codec())
+
+    def test_select_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            use_json_codec('simplejson')
+
+    def test_select_custom_codec(self):
+        codec = JsonCodec('custom', json.loads, json.dumps, lambda obj: b'{"custom": true}')
+        use_json_codec(codec)
+
+        self.assertEqual(b'{"custom": true}', JsonRpcRequest(V20, 'a_method').serialize_bytes())
+
+    def test_round_trip_with_stdlib(self):
+        use_json_codec('json')
+        self.__assert_round_trip()
+
+    @skipIf(ORJSON_CODEC is None, 'orjson is not installed')
+    def test_round_trip_with_orjson(self):
+        use_json_codec('orjson')
+        self.__assert_round_trip()
+
+    @skipIf(ORJSON_CODEC is None, 'orjson is not installed')
+    def test_orjson_supports_large_integers(self):
+        use_json_codec('orjson')
+
+        for big in (2 ** 70 + 1, -2 ** 63 - 1, 123456789012345678901234567890):
+            with self.subTest(big=big):
+                request = JsonRpcRequest(V20, 'a_method', {'big': big}, id='an_id')
+                parsed = JsonRpcRequest.parse(request.serialize_bytes()).params['big']
+
+                self.assertIs(int, type(parsed))
+                self.assertEqual(big, parsed)
+                self.assertEqual(big, JsonRpcRequest.parse(request.serialize()).params['big'])
+
+    @skipIf(ORJSON_CODEC is None, 'orjson is not installed')
+    def test_orjson_decodes_like_stdlib(self):
+        for body in (b'{"a": NaN}', b'{"a": Infinity}', b'{"a": 1e400}', b'{"a": "1234567890123456789"}', b'{"a": 0.1234567890123456789}'):
+            with self.subTest(body=body):
+                use_json_codec('json')
+                expected = json_codec().loads(body)
+                use_json_codec('orjson')
+
+                self.assertEqual(repr(expected), repr(json_codec().loads(body)))
+
+        with self.assertRaises(json.JSONDecodeError):
+            json_codec().loads(b'{"a": NaN')
+
+    def __assert_round_trip(self):
+        request = JsonRpcRequest(V20, 'a_method', {'a_string': 'äöü', 'a_list': [1, 2]}, id='an_id')
+        self.assertEqual(request.json(), JsonRpcRequest.parse(request.serialize()).json())
+        self.assertEqual(request.json(), JsonRpcRequest.parse(request.serialize_bytes()).json())
+        self.assertEqual(request.serialize().encode(), request.serialize_bytes())
+
+        response = JsonRpcResponse.result(200, 'OK', {'a_member': 42}, V20, 'an_id')
+        self.assertEqual(response, JsonRpcResponse.parse(response.serialize_bytes()))
+
+        with self.assertRaises(ParseError):
+            JsonRpcRequest.parse(b'no json')
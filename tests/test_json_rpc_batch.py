@@ -0,0 +1,80 @@
+import json
+from unittest import TestCase
+
+from sipgate_e2e_test_utils.json_rpc import JsonRpcBatchRequest, JsonRpcBatchResponse, JsonRpcRequest, JsonRpcResponse, ParseError, V11, V20
+
+
+class TestJsonRpcBatch(TestCase):
+    def test_parse_fails_non_json_body(self):
+        with self.assertRaises(ParseError):
+            JsonRpcBatchRequest.parse('<methodCall></methodCall>')
+
+    def test_parse_fails_non_array_body(self):
+        invalid_bodies = [
+            {'id': '42', 'method': 'a_method_name', 'params': {'a': 1}, 'jsonrpc': '2.0'},
+            [],
+            42,
+        ]
+
+        for body in invalid_bodies:
+            with self.subTest(body):
+                with self.assertRaises(ParseError):
+                    JsonRpcBatchRequest.parse(json.dumps(body))
+
+    def test_parse_requests(self):
+        batch = JsonRpcBatchRequest.parse(json.dumps([
+            {'id': '1', 'method': 'a_method_name', 'params': {'a': 1}, 'jsonrpc': '2.0'},
+            {'id': '2', 'method': 'another_method_name', 'params': {}, 'version': '1.1'},
+        ]))
+
+        self.assertEqual([], batch.errors())
+        self.assertEqual(['a_method_name', 'another_method_name'], [request.method for request in batch.valid()])
+        self.assertEqual([V20, V11], [request.version for request in batch.valid()])
+
+    def test_invalid_elements_do_not_fail_the_batch(self):
+        batch = JsonRpcBatchRequest.parse(json.dumps([
+            {'id': '1', 'method': 'a_method_name', 'params': {}, 'jsonrpc': '2.0'},
+            {'id': '2', 'method': 'a_method_name', 'params': None, 'version': '1.1'},
+            {'id': '3', 'method': 'a_method_name', 'params': {'a': 1}, 'jsonrpc': '2.0'},
+            'not_an_object',
+        ]))
+
+        self.assertIsInstance(batch.requests[0], ParseError)
+        self.assertIsInstance(batch.requests[1], ParseError)
+        self.assertIsInstance(batch.requests[2], JsonRpcRequest)
+        self.assertIsInstance(batch.requests[3], ParseError)
+        self.assertEqual(3, len(batch.errors()))
+
+    def test_serialize_requests(self):
+        batch = JsonRpcBatchRequest([
+            JsonRpcRequest(V20, 'a_method_name', {'a': 1}, id='1'),
+            JsonRpcRequest(V11, 'another_method_name', id='2'),
+        ])
+
+        self.assertEqual([request.json() for request in batch.requests], json.loads(batch.serialize()))
+        self.assertEqual(batch.json(), JsonRpcBatchRequest.parse(batch.serialize_bytes()).json())
+
+    def test_serialize_fails_with_invalid_elements(self):
+        batch = JsonRpcBatchRequest([ParseError('invalid')])
+
+        with self.assertRaises(ValueError):
+            batch.serialize()
+
+    def test_parse_responses(self):
+        batch = JsonRpcBatchResponse.parse(json.dumps([
+            {'id': '1', 'result': {'faultCode': 200, 'faultString': 'OK'}, 'error': None, 'jsonrpc': '2.0'},
+            {'id': '2', 'result': None, 'error': None, 'jsonrpc': '2.0'},
+            {'id': '3', 'error': {'faultCode': 500, 'faultString': 'NOT OK'}, 'jsonrpc': '2.0'},
+        ]))
+
+        self.assertEqual(JsonRpcResponse.result(200, 'OK', version=V20, id='1'), batch.responses[0])
+        self.assertIsInstance(batch.responses[1], ParseError)
+        self.assertEqual(JsonRpcResponse.error(500, 'NOT OK', version=V20, id='3'), batch.responses[2])
+
+    def test_serialize_responses(self):
+        batch = JsonRpcBatchResponse([
+            JsonRpcResponse.result(200, 'OK', {'a': 1}, V20, '1'),
+            JsonRpcResponse.error(500, 'NOT OK', V20, '2'),
+        ])
+
+        self.assertEqual(batch, JsonRpcBatchResponse.parse(batch.serialize_bytes()))
@@ -0,0 +1,71 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from sipgate_e2e_test_utils.json_rpc import JsonRpcRequest, V20
+from sipgate_e2e_test_utils.json_rpc_ids import counter_ids, prefixed_counter_ids, pooled_uuid4_ids, uuid4_ids, request_id, use_request_ids
+
+
+class TestJsonRpcIds(TestCase):
+    def tearDown(self):
+        use_request_ids(uuid4_ids())
+
+    def test_uuid4_by_default(self):
+        self.assertEqual(4, uuid.UUID(JsonRpcRequest(V20, 'a_method').id).version)
+
+    def test_counter(self):
+        ids = counter_ids()
+
+        self.assertEqual(['1', '2', '3'], [ids(), ids(), ids()])
+        self.assertEqual('42', counter_ids(start=42)())
+
+    def test_counters_are_independent(self):
+        ids, other_ids = counter_ids(), counter_ids()
+        ids()
+
+        self.assertEqual('2', ids())
+        self.assertEqual('1', other_ids())
+
+    def test_prefixed_counter(self):
+        ids = prefixed_counter_ids('load-')
+
+        self.assertEqual(['load-1', 'load-2'], [ids(), ids()])
+
+    def test_prefixed_counter_with_braces_in_prefix(self):
+        for prefix in ('run{1}-', 'job-{x}-', 'a}b'):
+            with self.subTest(prefix=prefix):
+                self.assertEqual(f'{prefix}1', prefixed_counter_ids(prefix)())
+
+    def test_prefixed_counter_defaults_to_random_prefix(self):
+        self.assertNotEqual(prefixed_counter_ids()(), prefixed_counter_ids()())
+
+    def test_pool_refills(self):
+        ids = pooled_uuid4_ids(size=3)
+        generated = [ids() for _ in range(10)]
+
+        self.assertEqual(10, len(set(generated)))
+        self.assertTrue(all(uuid.UUID(id).version == 4 for id in generated))
+
+    def test_pool_is_thread_safe(self):
+        ids = pooled_uuid4_ids(size=7)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            generated = list(executor.map(lambda _: [ids() for _ in range(1000)], range(8)))
+
+        self.assertEqual(8000, len({id for thread_ids in generated for id in thread_ids}))
+
+    def test_pool_size_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            pooled_uuid4_ids(size=0)
+
+    def test_select_for_process(self):
+        use_request_ids(prefixed_counter_ids('test-'))
+
+        self.assertEqual('test-1', JsonRpcRequest(V20, 'a_method').id)
+        self.assertEqual('test-2', request_id())
+
+    def test_explicit_id_does_not_consume_generator(self):
+        use_request_ids(counter_ids())
+        JsonRpcRequest(V20, 'a_method', id='an_id')
+
+        self.assertEqual('1', JsonRpcRequest(V20, 'a_method').id)
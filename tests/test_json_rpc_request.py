@@ -1,6 +1,8 @@
 import json
 from unittest import TestCase
+from unittest.mock import patch
 
+from sipgate_e2e_test_utils.json_codec import json_codec
 from sipgate_e2e_test_utils.json_rpc import JsonRpcRequest, ParseError, V11, V20
 
 
@@ -178,3 +180,59 @@ class TestJsonRpcRequest(TestCase):
                 'a_number': 42
             }
         }, request.json())
+
+    def test_parse_lazily(self):
+        params = {f'member_{i}': {'a_list': [i, 'a_string']} for i in range(200)}
+        body = json.dumps({'jsonrpc': '2.0', 'id': 'an_id', 'method': 'a_method_name', 'params': params})
+
+        with patch('sipgate_e2e_test_utils.json_rpc.json_codec', wraps=json_codec) as codec:
+            request = JsonRpcRequest.parse(body, lazy=True)
+
+            self.assertEqual(('a_method_name', 'an_id', V20), (request.method, request.id, request.version))
+            codec.assert_not_called()
+
+            self.assertEqual(params, request.params)
+            self.assertEqual(JsonRpcRequest.parse(body).json(), request.json())
+
+    def test_parse_lazily_members_after_params(self):
+        params = {f'member_{i}': 'a_string "with" {braces}' for i in range(200)}
+        body = f'{{"id": 42, "params": {json.dumps(params)}, "method": "a_method_name", "version": "1.1"}}'
+
+        request = JsonRpcRequest.parse(body.encode(), lazy=True)
+
+        self.assertEqual(('a_method_name', 42, V11), (request.method, request.id, request.version))
+        self.assertEqual(params, request.params)
+
+    def test_parse_lazily_validates_envelope(self):
+        params = json.dumps({f'member_{i}': i for i in range(500)})
+
+        with self.assertRaises(ParseError):
+            JsonRpcRequest.parse(f'{{"id": "an_id", "params": {params}, "method": ""}}', lazy=True)
+
+        with self.assertRaises(ParseError):
+            JsonRpcRequest.parse(f'{{"jsonrpc": "2.0", "params": {params}, "method": "a_method_name"}}', lazy=True)
+
+    def test_parse_lazily_raises_invalid_params_on_access(self):
+        params = json.dumps({f'member_{i}': i for i in range(500)}).replace('"member_0": 0', '"member_0": invalid')
+        request = JsonRpcRequest.parse(f'{{"jsonrpc": "2.0", "id": "an_id", "method": "a_method_name", "params": {params}}}', lazy=True)
+
+        with self.assertRaises(ParseError):
+            request.params
+
+    def test_parse_lazily_with_object_members_after_params(self):
+        params = {f'member_{i}': i for i in range(500)}
+        body = json.dumps({'jsonrpc': '2.0', 'method': 'a_method_name', 'params': params, 'id': {'an': 'object_id'}})
+
+        request = JsonRpcRequest.parse(body, lazy=True)
+
+        self.assertEqual(params, request.params)
+        self.assertEqual({'an': 'object_id'}, request.id)
+
+    def test_parse_lazily_validates_members_after_object_members(self):
+        params = json.dumps({f'member_{i}': i for i in range(500)})
+
+        with self.assertRaises(ParseError):
+            JsonRpcRequest.parse(f'{{"jsonrpc": "2.0", "id": "an_id", "method": "a_method_name", "params": {params}, "version": "1.1", "x": {{}}}}', lazy=True)
+
+        request = JsonRpcRequest.parse(f'{{"jsonrpc": "2.0", "id": "an_id", "method": "a_method_name", "params": {params}, "x": {{}}, "method": "other"}}', lazy=True)
+        self.assertEqual('other', request.method)
@@ -1,7 +1,9 @@
 import json
-from unittest import TestCase
+from unittest import TestCase, IsolatedAsyncioTestCase, skipIf
+from unittest.mock import patch
 
-from sipgate_e2e_test_utils.json_rpc import JsonRpcResponse, JsonRpcResponseType, ParseError, V11
+from sipgate_e2e_test_utils.json_rpc import JsonRpcResponse, JsonRpcResponseType, ParseError, V11, ijson
+from tests.chunked_reader import ChunkedReader
 
 
 class TestJsonRpcResponse(TestCase):
@@ -184,6 +186,66 @@ class TestJsonRpcResponse(TestCase):
             'error': None
         }, request.json())
 
+    def test_parse_lazily(self):
+        members = {f'member_{i}': {'a_list': [i, 'a_string']} for i in range(200)}
+        body = json.dumps({'result': {'faultCode': 200, 'faultString': 'OK', **members}, 'error': None, 'id': 'an_id', 'version': '1.1'})
+
+        response = JsonRpcResponse.parse(body, lazy=True)
+
+        self.assertEqual((JsonRpcResponseType.RESULT, 'an_id', V11), (response.type, response.id, response.version))
+        self.assertEqual((200, 'OK'), response.fault)
+        self.assertEqual(members, response.members)
+        self.assertEqual(JsonRpcResponse.result(200, 'OK', members, V11, 'an_id'), response)
+        self.assertEqual(response, JsonRpcResponse.parse(body))
+
+    def test_parse_lazily_validates_envelope(self):
+        result = json.dumps({'faultCode': 200, **{f'member_{i}': i for i in range(500)}})
+
+        with self.assertRaises(ParseError):
+            JsonRpcResponse.parse(f'{{"result": {result}, "error": "an_error"}}', lazy=True)
+
+        with self.assertRaises(ParseError):
+            JsonRpcResponse.parse(f'{{"result": {result}, "version": "2.0"}}', lazy=True)
+
+    def test_parse_lazily_raises_invalid_fault_on_access(self):
+        error = json.dumps({'faultCode': '500', **{f'member_{i}': i for i in range(500)}})
+        response = JsonRpcResponse.parse(f'{{"error": {error}, "result": null}}', lazy=True)
+
+        self.assertEqual(JsonRpcResponseType.ERROR, response.type)
+        with self.assertRaises(ParseError):
+            response.fault
+
+    def test_parse_lazily_validates_object_members_after_result(self):
+        result = json.dumps({'faultCode': 200, **{f'member_{i}': i for i in range(500)}})
+
+        with self.assertRaises(ParseError):
+            JsonRpcResponse.parse(f'{{"result": {result}, "error": {{"faultCode": 500}}}}', lazy=True)
+
+
+class TestJsonRpcResponseStream(IsolatedAsyncioTestCase):
+    @skipIf(ijson is None, 'ijson is not installed')
+    async def test_parse_stream(self):
+        await self.__assert_parse_stream()
+
+    async def test_parse_stream_without_ijson(self):
+        with patch('sipgate_e2e_test_utils.json_rpc.ijson', None):
+            await self.__assert_parse_stream()
+
+    @skipIf(ijson is None, 'ijson is not installed')
+    async def test_parse_stream_fails_invalid_json(self):
+        for body in (b'{"result": {"faultCode": 200', b'{"result": null, "error": null}', b'[]', b'{} {}'):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError):
+                    await JsonRpcResponse.parse_stream(ChunkedReader(body, 4))
+
+    async def __assert_parse_stream(self):
+        response = JsonRpcResponse.result(200, 'OK', {'a_string': 'äöü', 'a_float': 0.5, 'a_list': [{'a_number': i} for i in range(100)]}, V11, 'an_id')
+        body = response.serialize_bytes()
+
+        for chunk_size in (1, 7, len(body)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(response, await JsonRpcResponse.parse_stream(ChunkedReader(body, chunk_size)))
+
 
 def _fault(code: int, string: str):
     return {
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import tempfile
+from typing import Any, Callable, AsyncIterator
+from unittest import IsolatedAsyncioTestCase, TestCase, skipIf
+from unittest.mock import patch, sentinel
+
+try:
+    from confluent_kafka import KafkaError
+    from sipgate_e2e_test_utils import kafka
+except ImportError:
+    kafka = None
+
+
+class _Message:
+    def __init__(self, partition: int, offset: int):
+        self.__partition = partition
+        self.__offset = offset
+
+    def partition(self) -> int:
+        return self.__partition
+
+    def offset(self) -> int:
+        return self.__offset
+
+
+class _Producer:
+    """
+    Queues up to `capacity` records, which are delivered by the next but one `poll()` (like by a broker, after a while) or by `flush()`.
+    Records whose value is in `failing` are not delivered.
+    """
+
+    def __init__(self, capacity: int = 1000, failing: tuple[bytes, ...] = ()):
+        self.capacity = capacity
+        self.failing = failing
+        self.queue: list[tuple[int, int, bytes, Callable[[Any, Any], None]]] = []
+        self.polls = 0
+        self.produced: list[tuple[str, bytes, bytes]] = []
+        self.buffer_errors = 0
+        self.flushes = 0
+
+    def produce(self, topic: str, key: bytes, value: bytes, on_delivery: Callable[[Any, Any], None] = lambda error, msg: None) -> None:
+        if len(self.queue) >= self.capacity:
+            self.buffer_errors += 1
+            raise BufferError('queue is full')
+
+        self.queue.append((self.polls, len(self.produced), value, on_delivery))
+        self.produced.append((topic, key, value))
+
+    def poll(self, timeout: float) -> int:
+        self.polls += 1
+        return self.__deliver(lambda produced_at: produced_at < self.polls - 1)
+
+    def flush(self) -> int:
+        self.flushes += 1
+        self.__deliver(lambda _: True)
+        return 0
+
+    def __deliver(self, ready: Callable[[int], bool]) -> int:
+        delivered = [record for record in self.queue if ready(record[0])]
+        self.queue = [record for record in self.queue if not ready(record[0])]
+        for (_, offset, value, on_delivery) in delivered:
+            if value in self.failing:
+                on_delivery(KafkaError(KafkaError._MSG_TIMED_OUT), _Message(0, -1))
+            else:
+                on_delivery(None, _Message(0, offset))
+
+        return len(delivered)
+
+
+def _serializer(*_) -> Callable[[Any, Any], bytes]:
+    return lambda obj, ctx: repr(obj).encode()
+
+
+@skipIf(kafka is None, 'confluent-kafka with Avro support is not installed')
+class TestAvroSerializer(TestCase):
+    def setUp(self):
+        kafka.avro_serializer.cache_clear()
+        self.addCleanup(kafka.avro_serializer.cache_clear)
+
+        schema_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(schema_dir.cleanup)
+        self.schema_dir = schema_dir.name
+        for name in ('key.avsc', 'value.avsc'):
+            with open(os.path.join(self.schema_dir, name), 'w') as f:
+                f.write(f'{{"type": "record", "name": "{name}", "fields": []}}')
+
+        patcher = patch('sipgate_e2e_test_utils.kafka.AvroSerializer')
+        self.serializer = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_schema_from_schema_dir(self):
+        serializer = kafka.avro_serializer(sentinel.client, 'a_topic', 'key.avsc', self.schema_dir)
+
+        self.assertIs(self.serializer.return_value, serializer)
+        self.serializer.assert_called_once_with(sentinel.client, '{"type": "record", "name": "key.avsc", "fields": []}', conf={"auto.register.schemas": True})
+
+    def test_caches_serializer_per_client_topic_and_schema(self):
+        with patch('builtins.open', wraps=open) as opened:
+            for _ in range(3):
+                kafka.avro_serializer(sentinel.client, 'a_topic', 'key.avsc', self.schema_dir)
+                kafka.avro_serializer(sentinel.client, 'a_topic', 'value.avsc', self.schema_dir)
+                kafka.avro_serializer(sentinel.client, 'other_topic', 'key.avsc', self.schema_dir)
+                kafka.avro_serializer(sentinel.other_client, 'a_topic', 'key.avsc', self.schema_dir)
+
+        self.assertEqual(4, opened.call_count)
+        self.assertEqual(4, self.serializer.call_count)
+
+    def test_publish_avro_record_reuses_serializers(self):
+        producer = _Producer()
+
+        for i in range(3):
+            kafka.publish_avro_record(sentinel.client, producer, 'a_topic', 'key.avsc', {'id': i}, 'value.avsc', {'value': i}, schema_dir=self.schema_dir)
+
+        self.assertEqual(2, self.serializer.call_count)
+        self.assertEqual(3, len(producer.produced))
+
+    def test_missing_schema_is_not_cached(self):
+        with self.assertRaises(FileNotFoundError):
+            kafka.avro_serializer(sentinel.client, 'a_topic', 'missing.avsc', self.schema_dir)
+
+        with open(os.path.join(self.schema_dir, 'missing.avsc'), 'w') as f:
+            f.write('{}')
+
+        kafka.avro_serializer(sentinel.client, 'a_topic', 'missing.avsc', self.schema_dir)
+        self.serializer.assert_called_once()
+
+
+@skipIf(kafka is None, 'confluent-kafka with Avro support is not installed')
+@patch('sipgate_e2e_test_utils.kafka.avro_serializer', _serializer)
+class TestPublishAvroRecords(IsolatedAsyncioTestCase):
+    async def test_publishes_records_in_order_and_flushes_once(self):
+        producer = _Producer()
+
+        results = await kafka.publish_avro_records(None, producer, 'a_topic', 'key.avsc', 'value.avsc', [({'id': i}, {'value': i}) for i in range(5)])
+
+        self.assertEqual([(True, i) for i in range(5)], [(result.delivered, result.offset) for result in results])
+        self.assertEqual([('a_topic', repr({'id': i}).encode(), repr({'value': i}).encode()) for i in range(5)], producer.produced)
+        self.assertEqual(1, producer.flushes)
+
+    async def test_publishes_async_iterable(self):
+        async def records() -> AsyncIterator[tuple[dict, dict]]:
+            for i in range(3):
+                await asyncio.sleep(0)
+                yield {'id': i}, {'value': i}
+
+        results = await kafka.publish_avro_records(None, _Producer(), 'a_topic', 'key.avsc', 'value.avsc', records())
+
+        self.assertEqual(3, len(results))
+        self.assertTrue(all(result.delivered for result in results))
+
+    async def test_retries_after_buffer_error_without_blocking_event_loop(self):
+        producer = _Producer(capacity=1)
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.create_task(tick())
+        results = await kafka.publish_avro_records(None, producer, 'a_topic', 'key.avsc', 'value.avsc', [({'id': i}, {'value': i}) for i in range(7)])
+        ticker.cancel()
+
+        self.assertGreater(producer.buffer_errors, 0)
+        self.assertEqual(7, len(producer.produced))
+        self.assertEqual(list(range(7)), [result.offset for result in results])
+        self.assertGreater(ticks, 7)
+
+    async def test_reports_delivery_errors(self):
+        producer = _Producer(failing=(repr({'value': 1}).encode(),))
+
+        results = await kafka.publish_avro_records(None, producer, 'a_topic', 'key.avsc', 'value.avsc', [({'id': i}, {'value': i}) for i in range(3)])
+
+        self.assertEqual([True, False, True], [result.delivered for result in results])
+        self.assertEqual(KafkaError._MSG_TIMED_OUT, results[1].error.code())
+        self.assertEqual((None, None), (results[1].partition, results[1].offset))
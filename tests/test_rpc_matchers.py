@@ -4,7 +4,11 @@ from http_request_recorder import RecordedRequest
 
 
 from unittest import TestCase
-from sipgate_e2e_test_utils.rpc_matchers import xml_rpc, json_rpc
+from unittest.mock import Mock
+
+from sipgate_e2e_test_utils.json_codec import json_codec, use_json_codec, JsonCodec
+from sipgate_e2e_test_utils.xml_rpc import XmlRpcRequest
+from sipgate_e2e_test_utils.rpc_matchers import xml_rpc, json_rpc, json_rpc_batch, xml_rpc_method_name, METHOD_NAME_SCAN_LIMIT, RpcRouter, RpcProtocol, matches_partially
 
 
 class TestSipgateRpcMatchers(TestCase):
@@ -15,6 +19,9 @@ class TestSipgateRpcMatchers(TestCase):
             (False, ('GET', '/rpc2', b'<?xml version="1.0"?><methodCall><methodName>test_method</methodName><params><param><value></value></param></params></methodCall>')),
             (False, ('POST', '/rpc2', b'anydata')),
             (False, ('POST', '/rpc2', b'<?xml version="1.0"?><methodCall><methodName>another_method</methodName><params><param><value></value></param></params></methodCall>')),
+            (False, ('POST', '/rpc2', (b'<?xml version="1.0"?><methodCall><methodName>another_method</methodName>'
+                                       b'<params><param><value><![CDATA[<methodName>test_method</methodName>]]></value></param></params></methodCall>'))),
+            (False, ('POST', '/rpc2', b'<?xml version="1.0"?><methodCall><methodName>test_method_2</methodName><params><param><value></value></param></params></methodCall>')),
             (True, ('POST', '/rpc2', b'<?xml version="1.0"?><methodCall><methodName>test_method</methodName><params><param><value></value></param></params></methodCall>')),
             (True, ('POST', '/RPC2', b'<?xml version="1.0"?><methodCall><methodName>test_method</methodName><params><param><value></value></param></params></methodCall>')),
         ]
@@ -47,3 +54,180 @@ class TestSipgateRpcMatchers(TestCase):
                 request.body = body
 
                 self.assertEqual(expected, json_rpc('test_method')(request))
+
+    def test_xml_rpc_method_name(self):
+        assertions = [
+            ('test_method', b'<?xml version="1.0"?><methodCall><methodName>test_method</methodName><params></params></methodCall>'),
+            (None, b'<?xml version="1.0"?><methodCall><params></params></methodCall>'),
+            (None, b'<?xml version="1.0"?><methodCall><methodName>test_method'),
+            (None, b' ' * METHOD_NAME_SCAN_LIMIT + b'<?xml version="1.0"?><methodCall><methodName>test_method</methodName><params></params></methodCall>'),
+            ('a&b', b'<?xml version="1.0"?><methodCall><methodName>a&amp;b</methodName><params></params></methodCall>'),
+            ('a<b', b'<?xml version="1.0"?><methodCall><methodName>a&#60;b</methodName><params></params></methodCall>'),
+            ('test_method', b'<?xml version="1.0"?><methodCall><methodName><![CDATA[test_method]]></methodName><params></params></methodCall>'),
+            (None, b'<?xml version="1.0"?><methodCall><methodName>a&unknown;b</methodName><params></params></methodCall>'),
+        ]
+
+        for (expected, body) in assertions:
+            with self.subTest(f'expect {expected} for body={body.decode()}'):
+                request = RecordedRequest()
+                request.method = 'POST'
+                request.path = '/RPC2'
+                request.body = body
+
+                self.assertEqual(expected, xml_rpc_method_name(request))
+
+    def test_xml_rpc_matches_escaped_method_name(self):
+        request = RecordedRequest()
+        request.method = 'POST'
+        request.path = '/rpc2'
+        request.body = XmlRpcRequest('a&b', {'key': 'value'}).serialize_bytes()
+
+        self.assertTrue(xml_rpc('a&b')(request))
+        self.assertTrue(xml_rpc('a&b', {'key': 'value'})(request))
+        self.assertFalse(xml_rpc('a&amp;b')(request))
+
+    def test_router(self):
+        router = RpcRouter()
+        json_matcher = router.json_rpc('test_method')
+        xml_matcher = router.xml_rpc('test_method')
+        other_path_matcher = router.json_rpc('test_method', path='/other')
+        other_method_matcher = router.json_rpc('another_method')
+
+        request = RecordedRequest()
+        request.method = 'POST'
+        request.path = '/JSONRPC'
+        request.body = json.dumps({'method': 'test_method', 'version': '1.1', 'params': [], 'id': 42}).encode()
+
+        self.assertEqual((RpcProtocol.JSON_RPC, '/jsonrpc', 'test_method'), router.route(request))
+        self.assertTrue(json_matcher(request))
+        self.assertFalse(xml_matcher(request))
+        self.assertFalse(other_path_matcher(request))
+        self.assertFalse(other_method_matcher(request))
+        self.assertIs(json_matcher, router.json_rpc('test_method'))
+
+    def test_router_matches_xml_rpc(self):
+        router = RpcRouter()
+        matcher = router.xml_rpc('test_method')
+
+        request = RecordedRequest()
+        request.method = 'POST'
+        request.path = '/RPC2'
+        request.body = b'<?xml version="1.0"?><methodCall><methodName>test_method</methodName><params></params></methodCall>'
+
+        self.assertTrue(matcher(request))
+
+    def test_router_path_serves_single_protocol(self):
+        router = RpcRouter()
+        router.json_rpc('test_method', path='/rpc')
+
+        with self.assertRaises(ValueError):
+            router.xml_rpc('test_method', path='/RPC')
+
+    def test_json_rpc_params(self):
+        request = RecordedRequest()
+        request.method = 'POST'
+        request.path = '/jsonrpc'
+        request.body = json.dumps({'method': 'test_method', 'version': '1.1', 'params': {'a': 1, 'b': {'c': 2, 'd': 3}}, 'id': 42}).encode()
+
+        self.assertTrue(json_rpc('test_method', params={'a': 1})(request))
+        self.assertTrue(json_rpc('test_method', params={'b': {'c': 2}})(request))
+        self.assertTrue(json_rpc('test_method', params={'a': lambda a: a > 0})(request))
+        self.assertFalse(json_rpc('test_method', params={'a': 2})(request))
+        self.assertFalse(json_rpc('test_method', params={'e': 1})(request))
+        self.assertFalse(json_rpc('another_method', params={'a': 1})(request))
+
+    def test_xml_rpc_members(self):
+        request = RecordedRequest()
+        request.method = 'POST'
+        request.path = '/RPC2'
+        request.body = b"""<?xml version="1.0"?><methodCall><methodName>test_method</methodName><params><param><value><struct>
+            <member><name>a</name><value><i4>1</i4></value></member>
+            <member><name>b</name><value><array><data><value><string>c</string></value></data></array></value></member>
+        </struct></value></param></params></methodCall>"""
+
+        self.assertTrue(xml_rpc('test_method', members={'a': 1})(request))
+        self.assertTrue(xml_rpc('test_method', members={'a': 1, 'b': ['c']})(request))
+        self.assertFalse(xml_rpc('test_method', members={'b': []})(request))
+        self.assertFalse(xml_rpc('test_method', members={'a': 2})(request))
+
+    def test_body_is_decoded_once_per_request(self):
+        request = RecordedRequest()
+        request.method = 'POST'
+        request.path = '/jsonrpc'
+        request.body = json.dumps({'method': 'test_method', 'version': '1.1', 'params': {'a': 1}, 'id': 42}).encode()
+
+        default_codec = json_codec()
+        self.addCleanup(use_json_codec, default_codec)
+        loads = Mock(wraps=default_codec.loads)
+        use_json_codec(JsonCodec('counting', loads, default_codec.dumps, default_codec.dumps_bytes))
+
+        router = RpcRouter()
+        matchers = [json_rpc('test_method', params={'a': i}) for i in range(10)] + [json_rpc('another_method'), router.json_rpc('test_method', params={'a': 1})]
+        self.assertEqual([False, True] + [False] * 8 + [False, True], [matcher(request) for matcher in matchers])
+
+        self.assertEqual(1, loads.call_count)
+
+    def test_json_rpc_does_not_require_valid_request(self):
+        bodies = [
+            {'method': 'test_method', 'jsonrpc': '2.0', 'params': {'a': 1}},
+            {'method': 'test_method', 'params': {'a': 1}, 'id': 42},
+            {'method': 'test_method', 'version': '1.1', 'params': {'a': 1}, 'id': None},
+        ]
+        assertions = [
+            (True, {'method': 'test_method', 'jsonrpc': '2.0', 'params': {}, 'id': 1}, None),
+            (True, {'method': 'test_method', 'version': '1.1', 'params': None, 'id': 1}, None),
+            (True, {'method': 'test_method'}, None),
+            (False, {'method': 'test_method'}, {}),
+            (False, {'method': 42, 'params': {'a': 1}}, None),
+        ] + [(True, body, None) for body in bodies] + [(True, body, {'a': 1}) for body in bodies] + [(False, body, {'a': 2}) for body in bodies]
+
+        for (expected, body, params) in assertions:
+            with self.subTest(f'expect {expected} for {body=} {params=}'):
+                router = RpcRouter()
+                for matcher in (json_rpc('test_method', params=params), router.json_rpc('test_method', params=params)):
+                    request = RecordedRequest()
+                    request.method = 'POST'
+                    request.path = '/jsonrpc'
+                    request.body = json.dumps(body).encode()
+
+                    self.assertEqual(expected, matcher(request))
+
+    def test_router_params(self):
+        router = RpcRouter()
+
+        request = RecordedRequest()
+        request.method = 'POST'
+        request.path = '/jsonrpc'
+        request.body = json.dumps({'method': 'test_method', 'jsonrpc': '2.0', 'params': {'a': 1}, 'id': 42}).encode()
+
+        self.assertTrue(router.json_rpc('test_method', params={'a': 1})(request))
+        self.assertFalse(router.json_rpc('test_method', params={'a': 2})(request))
+
+    def test_matches_partially(self):
+        self.assertTrue(matches_partially({}, {'a': 1}))
+        self.assertTrue(matches_partially([{'a': 1}], [{'a': 1, 'b': 2}]))
+        self.assertFalse(matches_partially([1], [1, 2]))
+        self.assertFalse(matches_partially({'a': 1}, [1]))
+
+    def test_json_rpc_batch(self):
+        body = json.dumps([
+            {'method': 'another_method', 'jsonrpc': '2.0', 'params': {'a': 1}, 'id': 1},
+            {'method': 'test_method', 'jsonrpc': '2.0', 'params': {'a': 2}, 'id': 2},
+            {'method': 'invalid_method'},
+        ]).encode()
+        assertions = [
+            (True, json_rpc_batch('test_method')),
+            (True, json_rpc_batch('another_method', params={'a': 1})),
+            (False, json_rpc_batch('test_method', params={'a': 1})),
+            (False, json_rpc_batch('invalid_method')),
+            (False, json_rpc('test_method')),
+        ]
+
+        for (expected, matcher) in assertions:
+            with self.subTest(f'expect {expected}'):
+                request = RecordedRequest()
+                request.method = 'POST'
+                request.path = '/jsonrpc'
+                request.body = body
+
+                self.assertEqual(expected, matcher(request))
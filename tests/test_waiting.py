@@ -1,6 +1,14 @@
+import asyncio
+import json
+import sys
+import threading
+import time
 import unittest
+from datetime import timedelta
+from typing import Callable
 
-from sipgate_e2e_test_utils.waiting import wait_for_condition, wait_for_assertions
+from sipgate_e2e_test_utils.waiting import wait_for_condition, wait_for_assertions, wait_until, wait_until_asserted, wait_for_all, \
+    ProbeTimeoutError, WaitStatistics, use_wait_statistics, MAX_PROBE_THREADS
 
 
 class WaitingTest(unittest.IsolatedAsyncioTestCase):
@@ -36,3 +44,340 @@ class WaitingTest(unittest.IsolatedAsyncioTestCase):
             await wait_for_assertions(asserter, attempts=3)
 
         self.assertEqual(3, attempts_done)
+
+    async def test_wait_until_completes_when_condition_is_met(self) -> None:
+        await wait_until(lambda: True)
+
+    async def test_wait_until_throws_after_timeout(self) -> None:
+        started = time.monotonic()
+
+        with self.assertRaises(TimeoutError):
+            await wait_until(lambda: False, timeout=timedelta(milliseconds=50))
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    async def test_wait_until_backs_off_exponentially(self) -> None:
+        checks: list[float] = []
+
+        def condition() -> bool:
+            checks.append(time.monotonic())
+            return False
+
+        with self.assertRaises(TimeoutError):
+            await wait_until(condition, timeout=timedelta(milliseconds=200), max_interval=timedelta(milliseconds=20))
+
+        self.assertLess(len(checks), 40)
+        self.assertLess(checks[1] - checks[0], 0.01)
+
+    async def test_wait_until_is_woken_up_by_event(self) -> None:
+        event = asyncio.Event()
+        done = False
+
+        async def finish() -> None:
+            nonlocal done
+            await asyncio.sleep(0.05)
+            done = True
+            event.set()
+
+        task = asyncio.create_task(finish())
+        started = time.monotonic()
+        await wait_until(lambda: done, timeout=timedelta(seconds=5), max_interval=timedelta(seconds=5), trigger=event)
+
+        self.assertLess(time.monotonic() - started, 1)
+        await task
+
+    async def test_wait_until_is_woken_up_by_awaitable(self) -> None:
+        done = False
+
+        async def finish() -> None:
+            nonlocal done
+            await asyncio.sleep(0.05)
+            done = True
+
+        started = time.monotonic()
+        await wait_until(lambda: done, timeout=timedelta(seconds=5), max_interval=timedelta(seconds=5), trigger=finish())
+
+        self.assertLess(time.monotonic() - started, 1)
+
+    async def test_wait_until_cancels_its_awaitable(self) -> None:
+        cancelled = False
+
+        async def never() -> None:
+            nonlocal cancelled
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+
+        checks = iter([False, True])
+        await wait_until(lambda: next(checks), trigger=never())
+        await asyncio.sleep(0)
+
+        self.assertTrue(cancelled)
+
+    async def test_wait_until_rejects_invalid_intervals(self) -> None:
+        with self.assertRaises(ValueError):
+            await wait_until(lambda: True, initial_interval=timedelta(0))
+
+        with self.assertRaises(ValueError):
+            await wait_until(lambda: True, initial_interval=timedelta(seconds=2), max_interval=timedelta(seconds=1))
+
+    async def test_wait_until_asserted_throws_last_assertion_error(self) -> None:
+        attempts_done = 0
+
+        def asserter() -> None:
+            nonlocal attempts_done
+            attempts_done += 1
+
+            self.assertEqual(0, attempts_done)
+
+        with self.assertRaises(AssertionError) as raised:
+            await wait_until_asserted(asserter, timeout=timedelta(milliseconds=20))
+
+        self.assertIn(str(attempts_done), str(raised.exception))
+
+    async def test_wait_until_asserted_completes_when_assertion_succeeds(self) -> None:
+        attempts_done = 0
+
+        def asserter() -> None:
+            nonlocal attempts_done
+            attempts_done += 1
+
+            self.assertGreaterEqual(attempts_done, 3)
+
+        await wait_until_asserted(asserter)
+
+        self.assertEqual(3, attempts_done)
+
+    async def test_accepts_coroutine_condition(self) -> None:
+        attempts_done = 0
+
+        async def condition() -> bool:
+            nonlocal attempts_done
+            attempts_done += 1
+            await asyncio.sleep(0)
+            return attempts_done == 2
+
+        await wait_for_condition(condition, interval=timedelta(0))
+
+        self.assertEqual(2, attempts_done)
+
+    async def test_accepts_coroutine_asserter(self) -> None:
+        async def asserter() -> None:
+            await asyncio.sleep(0)
+            self.assertEqual(1, 2)
+
+        with self.assertRaises(AssertionError):
+            await wait_for_assertions(asserter, attempts=2, interval=timedelta(0))
+
+    async def test_counts_timed_out_probe_as_failed_attempt(self) -> None:
+        attempts_done = 0
+
+        async def condition() -> bool:
+            nonlocal attempts_done
+            attempts_done += 1
+            await asyncio.sleep(0 if attempts_done == 2 else 10)
+            return True
+
+        await wait_for_condition(condition, interval=timedelta(0), probe_timeout=timedelta(milliseconds=10))
+
+        self.assertEqual(2, attempts_done)
+
+    async def test_throws_probe_timeout_when_last_asserter_times_out(self) -> None:
+        with self.assertRaises(ProbeTimeoutError):
+            await wait_for_assertions(lambda: asyncio.sleep(10), attempts=2, interval=timedelta(0), probe_timeout=timedelta(milliseconds=10))
+
+    async def test_propagates_timeout_error_raised_by_probe(self) -> None:
+        async def condition() -> bool:
+            raise TimeoutError('from probe')
+
+        with self.assertRaisesRegex(TimeoutError, 'from probe'):
+            await wait_for_condition(condition, probe_timeout=timedelta(seconds=1))
+
+    async def test_wait_until_cancels_hanging_probe_at_deadline(self) -> None:
+        started = time.monotonic()
+
+        with self.assertRaises(ProbeTimeoutError):
+            await wait_until_asserted(lambda: asyncio.sleep(10), timeout=timedelta(milliseconds=50))
+
+        self.assertLess(time.monotonic() - started, 1)
+
+    async def test_wait_for_all_polls_conditions_concurrently(self) -> None:
+        started = time.monotonic()
+
+        def after(seconds: float) -> Callable[[], bool]:
+            return lambda: time.monotonic() - started >= seconds
+
+        async def slow_probe() -> bool:
+            await asyncio.sleep(0.05)
+            return True
+
+        await wait_for_all([slow_probe, slow_probe, after(0.05), after(0.1)], timeout=timedelta(seconds=1))
+
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    async def test_wait_for_all_throws_and_cancels_on_timeout(self) -> None:
+        pending_checks = 0
+
+        def pending() -> bool:
+            nonlocal pending_checks
+            pending_checks += 1
+            return False
+
+        with self.assertRaises(TimeoutError):
+            await wait_for_all([lambda: False, pending], timeout=timedelta(milliseconds=20))
+
+        checks = pending_checks
+        await asyncio.sleep(0.05)
+        self.assertEqual(checks, pending_checks)
+
+    async def test_runs_blocking_probe_in_thread(self) -> None:
+        threads: list[threading.Thread] = []
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        def asserter() -> None:
+            threads.append(threading.current_thread())
+            time.sleep(0.05)
+
+        ticker = asyncio.create_task(tick())
+        await wait_for_assertions(asserter, probe_timeout=timedelta(seconds=1), in_thread=True)
+        ticker.cancel()
+
+        self.assertNotEqual(threading.main_thread(), threads[0])
+        self.assertTrue(threads[0].daemon)
+        self.assertGreater(ticks, 3)
+
+    async def test_wait_until_enforces_deadline_on_hanging_thread(self) -> None:
+        release = threading.Event()
+        self.addCleanup(release.set)
+        started = time.monotonic()
+
+        with self.assertRaises(TimeoutError):
+            await wait_until(release.wait, timeout=timedelta(milliseconds=50), in_thread=True)
+
+        self.assertLess(time.monotonic() - started, 1)
+
+    async def test_wait_for_assertions_enforces_probe_timeout_on_hanging_thread(self) -> None:
+        release = threading.Event()
+        self.addCleanup(release.set)
+        started = time.monotonic()
+
+        with self.assertRaises(ProbeTimeoutError):
+            await wait_for_assertions(release.wait, attempts=2, interval=timedelta(0), probe_timeout=timedelta(milliseconds=20), in_thread=True)
+
+        self.assertLess(time.monotonic() - started, 1)
+
+    async def test_hanging_probes_do_not_pile_up_threads(self) -> None:
+        release = threading.Event()
+        self.addCleanup(release.set)
+        calls = 0
+        threads = threading.active_count()
+
+        def hanging() -> bool:
+            nonlocal calls
+            calls += 1
+            return release.wait()
+
+        with self.assertRaises(TimeoutError):
+            await wait_until(hanging, timeout=timedelta(milliseconds=200), probe_timeout=timedelta(milliseconds=5), in_thread=True)
+
+        self.assertLessEqual(threading.active_count(), threads + MAX_PROBE_THREADS)
+        self.assertLessEqual(calls, MAX_PROBE_THREADS)
+
+        # probes are not queued, so none of them runs after the wait has ended
+        calls_during_wait = calls
+        release.set()
+        await asyncio.sleep(0.05)
+        self.assertEqual(calls_during_wait, calls)
+
+        await wait_until(lambda: threading.active_count() <= threads)
+
+    async def test_attempt_based_waits_require_probe_timeout_in_thread(self) -> None:
+        with self.assertRaises(ValueError):
+            await wait_for_condition(lambda: True, in_thread=True)
+
+        with self.assertRaises(ValueError):
+            await wait_for_assertions(lambda: None, in_thread=True)
+
+    async def test_wait_for_all_runs_blocking_probes_concurrently(self) -> None:
+        started = time.monotonic()
+
+        def blocking() -> bool:
+            time.sleep(0.05)
+            return True
+
+        await wait_for_all([blocking] * 4, in_thread=True)
+
+        self.assertLess(time.monotonic() - started, 0.15)
+
+
+class WaitStatisticsTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.statistics = WaitStatistics()
+        use_wait_statistics(self.statistics)
+        self.addCleanup(use_wait_statistics, None)
+
+    async def test_records_attempts_elapsed_time_and_call_site(self) -> None:
+        checks = iter([False, False, True])
+
+        line = _line() + 1
+        await wait_for_condition(lambda: next(checks), interval=timedelta(milliseconds=10))
+
+        [record] = self.statistics.records()
+        self.assertEqual('wait_for_condition', record.function)
+        self.assertEqual(f'{__file__}:{line}', record.call_site)
+        self.assertEqual(3, record.attempts)
+        self.assertGreaterEqual(record.elapsed, 0.02)
+        self.assertAlmostEqual(0.04, record.budget)
+        self.assertTrue(record.succeeded)
+
+    async def test_records_exhausted_waits(self) -> None:
+        with self.assertRaises(AssertionError):
+            await wait_for_assertions(lambda: self.assertEqual(1, 2), attempts=2, interval=timedelta(0))
+
+        with self.assertRaises(TimeoutError):
+            await wait_until(lambda: False, timeout=timedelta(milliseconds=20))
+
+        await wait_until_asserted(lambda: None)
+
+        self.assertEqual(['wait_for_assertions', 'wait_until'], [record.function for record in self.statistics.exhausted()])
+        self.assertEqual(2, self.statistics.exhausted()[0].attempts)
+        self.assertGreater(self.statistics.exhausted()[1].attempts, 1)
+
+    async def test_records_call_site_of_wait_for_all(self) -> None:
+        line = _line() + 1
+        await wait_for_all([lambda: True, lambda: True])
+
+        self.assertEqual([f'{__file__}:{line}'] * 2, [record.call_site for record in self.statistics.records()])
+
+    async def test_reports_slowest_waits_as_json(self) -> None:
+        await wait_for_condition(lambda: True)
+        await wait_until(lambda: asyncio.sleep(0.02, True))
+        await wait_until(lambda: asyncio.sleep(0.01, True))
+
+        report = json.loads(self.statistics.json(top=2))
+
+        self.assertEqual(3, report['waits'])
+        self.assertGreaterEqual(report['elapsed'], 0.03)
+        self.assertEqual(2, len(report['slowest']))
+        self.assertGreaterEqual(report['slowest'][0]['elapsed'], 0.02)
+        self.assertEqual([], report['exhausted'])
+
+    async def test_records_nothing_when_disabled(self) -> None:
+        use_wait_statistics(None)
+
+        await wait_until(lambda: True)
+
+        self.assertEqual([], self.statistics.records())
+
+
+def _line() -> int:
+    return sys._getframe(1).f_lineno
@@ -1,7 +1,9 @@
 from unittest import TestCase
+from unittest.mock import patch
 from xml.etree.ElementTree import ParseError
 
-from sipgate_e2e_test_utils.xml_rpc import XmlRpcRequest
+from sipgate_e2e_test_utils import xml_rpc
+from sipgate_e2e_test_utils.xml_rpc import XmlRpcRequest, register_type
 
 
 class TestSipgateXmlRpcRequest(TestCase):
@@ -106,6 +108,43 @@ class TestSipgateXmlRpcRequest(TestCase):
         with self.assertRaises(NotImplementedError):
             XmlRpcRequest.parse(body)
 
+    def test_unsupported_nested_data_type(self):
+        body = """<?xml version="1.0"?>
+                    <methodCall>
+                        <methodName>a_method_name</methodName>
+                        <params><param><value>
+                            <struct>
+                                <member><name>nested</name><value><struct>
+                                    <member><name>PI</name><value><float>3.14</float></value></member>
+                                </struct></value></member>
+                            </struct>
+                        </value></param></params>
+                    </methodCall>"""
+
+        with self.assertRaises(ValueError):
+            XmlRpcRequest.parse(body)
+
+    def test_invalid_xml_is_reported_before_invalid_content(self):
+        body = """<?xml version="1.0"?>
+                    <methodResponse>
+                        <params><param><value><struct>
+                    </methodResponse>"""
+
+        with self.assertRaises(ParseError):
+            XmlRpcRequest.parse(body)
+
+    def test_many_members(self):
+        members = ''.join(f'<member><name>member_{i}</name><value><i4>{i}</i4></value></member>' for i in range(5000))
+        body = f"""<?xml version="1.0"?>
+                    <methodCall>
+                        <methodName>a_method_name</methodName>
+                        <params><param><value><struct>{members}</struct></value></param></params>
+                    </methodCall>"""
+
+        parsed = XmlRpcRequest.parse(body)
+        self.assertEqual(5000, len(parsed.members))
+        self.assertEqual(4999, parsed.members['member_4999'])
+
     def test_has_string_representation(self):
         body = """<?xml version="1.0"?>
             <methodCall>
@@ -178,3 +217,62 @@ class TestSipgateXmlRpcRequest(TestCase):
 
         # TODO: use better comparison, this would ignore spaces in values
         self.assertEqual(''.join(expected_body.split()), ''.join(request.serialize().split()))
+
+    def test_serialization_boolean(self):
+        request = XmlRpcRequest('a_method', {'yes': True, 'no': False})
+
+        self.assertIn('<boolean>1</boolean>', request.serialize())
+        self.assertIn('<boolean>0</boolean>', request.serialize())
+        self.assertEqual(request, XmlRpcRequest.parse(request.serialize()))
+
+    @patch.dict(xml_rpc._VALUE_PARSERS)
+    @patch.dict(xml_rpc._VALUE_SERIALIZERS)
+    def test_registered_type(self):
+        register_type('double', float, lambda text: float('' if text is None else text), repr)
+        request = XmlRpcRequest('a_method', {'pi': 3.14, 'values': [1.5]})
+
+        self.assertIn('<double>3.14</double>', request.serialize())
+        self.assertEqual(request, XmlRpcRequest.parse(request.serialize()))
+
+    @patch.dict(xml_rpc._VALUE_PARSERS)
+    @patch.dict(xml_rpc._VALUE_SERIALIZERS)
+    def test_registered_nil_type_in_struct(self):
+        register_type('nil', type(None), lambda text: None, lambda value: '')
+        request = XmlRpcRequest('a_method', {'a': None, 'values': [None, 1], 'nested': {'b': None}})
+
+        self.assertIn('<member><name>a</name><value><nil></nil></value></member>', request.serialize(compact=True))
+        self.assertEqual(request, XmlRpcRequest.parse(request.serialize()))
+
+    def test_none_members_are_omitted_without_nil_type(self):
+        request = XmlRpcRequest('a_method', {'a': None, 'b': 1})
+
+        self.assertEqual({'b': 1}, XmlRpcRequest.parse(request.serialize()).members)
+
+    def test_structured_types_cannot_be_registered(self):
+        with self.assertRaises(ValueError):
+            register_type('struct', dict, lambda text: {}, str)
+
+    def test_compact_serialization(self):
+        request = XmlRpcRequest('a_method', {
+            'a_struct': {'an_int': 23},
+            'an_array': ['a', 'b'],
+        })
+
+        self.assertEqual(
+            '<?xml version="1.0"?><methodCall><methodName>a_method</methodName><params><param><value><struct>'
+            '<member><name>a_struct</name><value><struct><member><name>an_int</name><value><i4>23</i4></value></member></struct></value></member>'
+            '<member><name>an_array</name><value><array><data><value><string>a</string></value><value><string>b</string></value></data></array></value></member>'
+            '</struct></value></param></params></methodCall>',
+            request.serialize(compact=True))
+
+    def test_serialization_to_bytes(self):
+        request = XmlRpcRequest('a_method', {'a_string': 'äöü'})
+
+        self.assertEqual(request.serialize().encode('utf-8'), request.serialize_bytes())
+        self.assertEqual(request.serialize(compact=True).encode('utf-8'), request.serialize_bytes(compact=True))
+        self.assertEqual(request, XmlRpcRequest.parse(request.serialize_bytes()))
+
+    def test_serialization_escapes_strings(self):
+        request = XmlRpcRequest('a_method', {'a&b': '<tag> & more'})
+
+        self.assertEqual(request, XmlRpcRequest.parse(request.serialize()))
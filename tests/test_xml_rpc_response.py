@@ -1,7 +1,8 @@
-from unittest import TestCase
+from unittest import TestCase, IsolatedAsyncioTestCase
 from xml.etree.ElementTree import ParseError
 
-from sipgate_e2e_test_utils.xml_rpc import XmlRpcResponse, XmlRpcResponseType
+from sipgate_e2e_test_utils.xml_rpc import XmlRpcResponse, XmlRpcResponseType, FrozenXmlRpcResponse
+from tests.chunked_reader import ChunkedReader
 
 
 class TestSipgateXmlRpcResponse(TestCase):
@@ -240,3 +241,79 @@ class TestSipgateXmlRpcResponse(TestCase):
         # TODO: use better comparison
         #  this would ignore spaces in values and does not ignore order of params
         self.assertEqual(''.join(expected_body.split()), ''.join(response.serialize().split()))
+
+    def test_compact_serialization(self):
+        response = XmlRpcResponse.error(407, 'NOT SO OKAY')
+
+        self.assertEqual(
+            '<?xml version="1.0"?><methodResponse><fault><value><struct>'
+            '<member><name>faultCode</name><value><i4>407</i4></value></member>'
+            '<member><name>faultString</name><value><string>NOT SO OKAY</string></value></member>'
+            '</struct></value></fault></methodResponse>',
+            response.serialize(compact=True))
+
+    def test_serialization_to_bytes(self):
+        response = XmlRpcResponse.result(200, 'OK', {'a_string': 'äöü'})
+
+        self.assertEqual(response.serialize().encode('utf-8'), response.serialize_bytes())
+        self.assertEqual(response.serialize(compact=True).encode('utf-8'), response.serialize_bytes(compact=True))
+        self.assertEqual(response, XmlRpcResponse.parse(response.serialize_bytes()))
+
+    def test_frozen_response(self):
+        response = XmlRpcResponse.result(200, 'OK', {'a_struct': {'an_array': [1, 2]}})
+        frozen = response.freeze()
+
+        self.assertIsInstance(frozen, FrozenXmlRpcResponse)
+        self.assertEqual(response.serialize(), frozen.serialize())
+        self.assertEqual(response.serialize_bytes(), frozen.serialize_bytes())
+        self.assertIs(frozen.serialize_bytes(), frozen.serialize_bytes())
+        self.assertEqual(response, XmlRpcResponse.parse(frozen.serialize_bytes()))
+
+    def test_frozen_response_is_hashable(self):
+        frozen = XmlRpcResponse.result(200, 'OK', {'a_struct': {'an_array': [1, 2]}}).freeze()
+        same = XmlRpcResponse.result(200, 'OK', {'a_struct': {'an_array': [1, 2]}}).freeze()
+        other = XmlRpcResponse.result(200, 'OK', {'a_struct': {'an_array': [1, 3]}}).freeze()
+
+        self.assertEqual(hash(frozen), hash(same))
+        self.assertEqual(frozen, same)
+        self.assertNotEqual(frozen, other)
+        self.assertEqual('a_response', {frozen: 'a_response'}[same])
+        self.assertEqual(2, len({frozen, same, other}))
+
+    def test_frozen_response_equality_ignores_order_of_members(self):
+        response = XmlRpcResponse.result(200, 'OK', {'a': 1, 'b': {'c': [1, {'d': 'x', 'e': True}], 'f': 'y'}})
+        reordered = XmlRpcResponse.result(200, 'OK', {'b': {'f': 'y', 'c': [1, {'e': True, 'd': 'x'}]}, 'a': 1})
+        self.assertEqual(response, reordered)
+
+        self.assertEqual(response.freeze(), reordered.freeze())
+        self.assertEqual(hash(response.freeze()), hash(reordered.freeze()))
+        self.assertNotEqual(response.freeze(), XmlRpcResponse.error(200, 'OK').freeze())
+
+    def test_frozen_response_is_not_affected_by_changes(self):
+        response = XmlRpcResponse.result(200, 'OK', {'a_struct': {'an_int': 1}})
+        frozen = response.freeze()
+        body = frozen.serialize_bytes()
+
+        response.members['a_struct']['an_int'] = 2
+
+        self.assertEqual(body, frozen.serialize_bytes())
+        with self.assertRaises(TypeError):
+            frozen.members['a_struct']['an_int'] = 3
+
+
+class TestSipgateXmlRpcResponseStream(IsolatedAsyncioTestCase):
+    async def test_parse_stream(self):
+        response = XmlRpcResponse.result(200, 'OK', {'a_string': 'äöü <escaped>', 'a_list': [{'a_number': i} for i in range(100)]})
+        body = response.serialize_bytes(compact=False)
+
+        for chunk_size in (1, 7, len(body)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(response, await XmlRpcResponse.parse_stream(ChunkedReader(body, chunk_size)))
+
+    async def test_parse_stream_fails_invalid_xml(self):
+        with self.assertRaises(ParseError):
+            await XmlRpcResponse.parse_stream(ChunkedReader(b'<methodResponse><params>', 4))
+
+    async def test_parse_stream_fails_invalid_response(self):
+        with self.assertRaises(ValueError):
+            await XmlRpcResponse.parse_stream(ChunkedReader(b'<methodCall></methodCall>', 4))